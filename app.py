@@ -1,16 +1,76 @@
+import asyncio
+from contextlib import asynccontextmanager
 import logging
+import os
 import threading
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from typing import Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from conferences.database.cache import conference_cache
+from conferences.database.database_repository import close_supabase, init_supabase
+from conferences.database.write_behind import write_behind
+from conferences.src.admission.admin import require_admin
+from conferences.src.admission.rate_limiter import rate_limiter
+from conferences.src.monitoring.metrics import PrometheusWriter
+from conferences.src.monitoring.profiler import PROFILE_MAX_SECONDS, profiler
+from conferences.src.monitoring.tracing import TracingMiddleware, tracer
 from conferences.src.repository.rest_controller import router
+from conferences.src.repository.serialization import FAST_JSON, FastJSONResponse, TracedRoute
+from conferences.src.streaming.broker import create_broker
+from conferences.src.streaming.placement import create_placement
+from conferences.src.streaming.recorder import NO_CHANNEL, RECORD_HEADER, RecordingReader, create_recorder, valid_room_id
 from conferences.src.streaming.signal_server import ConnectionManager
-import uvicorn
-from technical_support_bot.bot import run_telegram_bot
 
-app = FastAPI()
+placement = create_placement()
+recorder = create_recorder(placement.node_id)
+manager = ConnectionManager(broker=create_broker(), rate_limiter=rate_limiter, placement=placement, recorder=recorder)
 
-app.include_router(router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Клиент Supabase создается один раз и переиспользует пул соединений
+    try:
+        await init_supabase()
+    except Exception as e:
+        logger.error(f"Ошибка подключения к Supabase: {e}")
+
+    # Узел регистрируется в реестре и перестраивает кольцо при изменении состава узлов
+    try:
+        await placement.start(manager.rebalance)
+    except Exception as e:
+        logger.error(f"Ошибка регистрации узла: {e}")
+
+    # Список записываемых комнат читается из общего состояния
+    if recorder is not None:
+        try:
+            await recorder.start()
+        except Exception as e:
+            logger.error(f"Ошибка чтения состояния записи: {e}")
+
+    # Отложенная запись восстанавливает журнал до приема запросов
+    if write_behind is not None:
+        await write_behind.start()
+
+    yield
 
-manager = ConnectionManager()
+    # Отключение от реестра узлов, брокера сообщений, кэша и Supabase при остановке
+    await placement.close()
+    await manager.stop()
+    await manager.broker.close()
+    await rate_limiter.close()
+    await conference_cache.close()
+    if write_behind is not None:
+        await write_behind.close()
+    if recorder is not None:
+        await recorder.close()
+    await close_supabase()
+    tracer.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse if FAST_JSON else JSONResponse)
+# Маршруты приложения тоже пишут отрезок serialize
+app.router.route_class = TracedRoute
+
+app.include_router(router)
+app.add_middleware(TracingMiddleware)
 
 logger = logging.basicConfig(
     level=logging.INFO,
@@ -22,38 +82,136 @@ logger = logging.getLogger(__name__)
 # WebSocket конечная точка для обмена сообщениями в реальном времени
 @app.websocket("/ws/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str):
-    # Подключаем клиента к комнате
-    await manager.connect(websocket, room_id)
+    # Подключаем клиента к комнате (во время остановки процесса соединение сразу закрывается)
+    if not await manager.connect(websocket, room_id):
+        return
 
     try:
         while True:
-            try:
-                # Получаем данные от клиента
-                data = await websocket.receive_bytes()
-                logger.info(f"Получено {len(data)} байт из комнаты {room_id}")
-                # Широковещательная передача данных в комнату
-                await manager.broadcast(room_id, data)
-                logger.info(f"Передано {len(data)} байт в комнату {room_id}")
-            except Exception as e:
-                # Логируем ошибку при получении данных
-                logger.error(f"Ошибка при получении данных: {e}")
-                break
+            # Получаем данные от клиента
+            data = await websocket.receive_bytes()
+            # Широковещательная передача данных в комнату (объем трафика учитывается в /metrics)
+            await manager.handle_frame(websocket, room_id, data)
 
     except WebSocketDisconnect:
         # Логируем отключение клиента
         logger.info(f"Клиент отключился от комнаты {room_id}")
-        manager.disconnect(websocket, room_id)
 
     except Exception as e:
         # Логируем ошибку WebSocket
         logger.error(f"Ошибка WebSocket: {e}")
+
+    finally:
+        # Останавливаем задачу отправки клиента в любом случае
         manager.disconnect(websocket, room_id)
 
-if __name__ == "__main__":
-    # Запуск FastAPI в основном потоке
-    fastapi_thread = threading.Thread(target=uvicorn.run, args=(app,), kwargs={"host": "0.0.0.0", "port": 8000, "log_level": "info"})
-    fastapi_thread.start()
+# Узел signal-сервера, который обслуживает комнату: клиент вызывает перед подключением к /ws/{room_id}
+@app.get("/room_node/{room_id}")
+async def room_node(room_id: str, request: Request):
+    owner = placement.owner(room_id) if placement.enabled else None
+    if owner is None:
+        # Размещение не настроено: комнату обслуживает этот же узел
+        base_url = str(request.base_url).rstrip("/").replace("http", "ws", 1)
+        return {"room_id": room_id, "node_id": placement.node_id, "url": f"{base_url}/ws/{room_id}"}
+
+    node_id, url = owner
+    return {"room_id": room_id, "node_id": node_id, "url": url}
+
+# Счетчики доставки сообщений в комнате
+@app.get("/room_stats/{room_id}")
+async def room_stats(room_id: str):
+    stats = manager.get_room_stats(room_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Комната не найдена")
+    return stats
 
-    # Запуск Telegram-бота в отдельном потоке
-    telegram_bot_thread = threading.Thread(target=run_telegram_bot)
-    telegram_bot_thread.start()
\ No newline at end of file
+def recording_reader(room_id: str) -> RecordingReader:
+    if recorder is None:
+        raise HTTPException(status_code=404, detail="Запись конференций выключена")
+    if not valid_room_id(room_id):
+        raise HTTPException(status_code=400, detail="Недопустимый room_id")
+    return RecordingReader(recorder.directory, room_id)
+
+# Включение записи комнаты (при RECORDING_ALL=1 записываются все комнаты).
+# Все маршруты записи доступны только с X-Admin-Token
+@app.post("/recordings/{room_id}/start", dependencies=[Depends(require_admin)])
+async def start_recording(room_id: str):
+    recording_reader(room_id)
+    await recorder.start_room(room_id)
+    return {"room_id": room_id, "recording": True}
+
+@app.post("/recordings/{room_id}/stop", dependencies=[Depends(require_admin)])
+async def stop_recording(room_id: str):
+    recording_reader(room_id)
+    await recorder.stop_room(room_id)
+    return {"room_id": room_id, "recording": recorder.recording(room_id)}
+
+# Сегменты записи комнаты
+@app.get("/recordings/{room_id}", dependencies=[Depends(require_admin)])
+async def list_recordings(room_id: str):
+    reader = recording_reader(room_id)
+    segments = [
+        {"start": start, "writer": writer_id, "bytes": os.path.getsize(path)}
+        for start, writer_id, path in await asyncio.to_thread(reader.segments)
+    ]
+    if not segments:
+        raise HTTPException(status_code=404, detail="Записи комнаты не найдены")
+    return {"room_id": room_id, "recording": recorder.recording(room_id), "segments": segments}
+
+# Воспроизведение записи за интервал [start, end) в миллисекундах Unix-времени.
+# Ответ — кадры в формате сегмента: заголовок RECORD_HEADER и исходный кадр.
+# Генератор синхронный, поэтому чтение mmap выполняется в пуле потоков, а не в цикле событий
+@app.get("/recordings/{room_id}/replay", dependencies=[Depends(require_admin)])
+async def replay_recording(room_id: str, start: int = 0, end: Optional[int] = None):
+    reader = recording_reader(room_id)
+
+    def stream():
+        for frame in reader.frames(start, end):
+            channel = NO_CHANNEL if frame.channel is None else frame.channel
+            yield RECORD_HEADER.pack(frame.timestamp, frame.sender_id, channel, len(frame.payload)) + frame.payload
+
+    return StreamingResponse(stream(), media_type="application/octet-stream")
+
+# Профиль цикла событий за seconds секунд в виде свернутых стеков (только с X-Admin-Token)
+@app.get("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000)
+):
+    result = await asyncio.to_thread(profiler.run, threading.get_ident(), seconds, interval_ms / 1000)
+    if result is None:
+        raise HTTPException(status_code=409, detail="Профиль уже снимается")
+    return PlainTextResponse(result)
+
+# Метрики signal-сервера и кэша в формате Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    writer = PrometheusWriter()
+    manager.collect_metrics(writer)
+
+    for name, value in conference_cache.stats.as_dict().items():
+        writer.counter(f"conference_cache_{name}_total", f"Conference cache {name.replace('_', ' ')}", value)
+
+    for scope, count in rate_limiter.stats.rejected.items():
+        writer.counter("conference_rate_limited_total", "Requests rejected by rate limits", count, {"scope": scope})
+
+    if write_behind is not None:
+        writer.gauge("conference_write_behind_pending", "Conferences with changes waiting to be written", len(write_behind.pending))
+        for name, value in write_behind.stats.as_dict().items():
+            writer.counter(f"conference_write_behind_{name}_total", f"Write-behind {name.replace('_', ' ')}", value)
+
+    if recorder is not None:
+        writer.gauge("conference_recording_rooms", "Rooms recorded on request", len(recorder.active))
+        for name, value in recorder.stats.as_dict().items():
+            writer.counter(f"conference_recorder_{name}_total", f"Recorder {name.replace('_', ' ')}", value)
+
+    if tracer.enabled:
+        writer.counter("conference_trace_spans_total", "Exported trace spans", tracer.exported)
+        writer.counter("conference_trace_export_errors_total", "Failed span exports", tracer.export_errors)
+
+    return PlainTextResponse(writer.render(), media_type="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    # Запуск API (см. server.py); Telegram-бот запускается отдельно: python -m technical_support_bot.bot
+    from server import main
+    main()
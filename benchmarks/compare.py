@@ -0,0 +1,37 @@
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+# Сравнение двух результатов run_benchmark.py: числовые показатели и их изменение в процентах
+
+def flatten(data: dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, f"{path}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline = json.load(baseline_file)
+        candidate = json.load(candidate_file)
+
+    baseline_values: Dict[str, float] = dict(flatten({k: v for k, v in baseline.items() if k != "config"}))
+    candidate_values: Dict[str, float] = dict(flatten({k: v for k, v in candidate.items() if k != "config"}))
+
+    width = max((len(key) for key in baseline_values), default=0)
+    for key, old in baseline_values.items():
+        if key == "timestamp" or key not in candidate_values:
+            continue
+        new = candidate_values[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{key:<{width}}  {old:>14.3f}  {new:>14.3f}  {change:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import asyncio
+import operator
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Локальная замена Supabase для нагрузочных тестов: таблицы в памяти процесса
+# и имитация сетевой задержки каждого запроса. Поддерживает подмножество
+# построителя запросов, которое использует rest_controller.py
+
+# Ошибка запроса, как APIError postgrest (например, нарушение уникальности room_id)
+class FakeAPIError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+# Уникальные столбцы таблиц, как в схеме базы
+UNIQUE_COLUMNS = {"conferences": "room_id"}
+
+# Операторы сравнения фильтров PostgREST
+COMPARISONS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+class FakeResponse:
+    def __init__(self, data: Any, error: Optional[dict] = None):
+        self.data = data
+        self.error = error
+
+# Деление списка условий по запятым верхнего уровня (вне скобок и кавычек)
+def _split_conditions(text: str) -> List[str]:
+    parts, depth, quoted, escaped, start = [], 0, False, False, 0
+    for index, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return parts
+
+# Значение фильтра: строка в кавычках с экранированием \\ и \", true/false или число
+def _parse_value(text: str) -> Any:
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        value, escaped = [], False
+        for char in text[1:-1]:
+            if escaped or char != "\\":
+                value.append(char)
+                escaped = False
+            else:
+                escaped = True
+        return "".join(value)
+    if text in ("true", "false"):
+        return text == "true"
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+# Разбор логического фильтра PostgREST в дерево ("and" | "or", [условия]),
+# где условие — (столбец, оператор, значение) или вложенное дерево.
+# Поддерживает формат pagination.keyset_filter: column.op.value и and(...)/or(...)
+def parse_logic(kind: str, text: str) -> tuple:
+    conditions = []
+    for part in _split_conditions(text):
+        group, _, rest = part.partition("(")
+        if group in ("and", "or") and rest.endswith(")"):
+            conditions.append(parse_logic(group, rest[:-1]))
+            continue
+
+        column, _, rest = part.partition(".")
+        op, _, value = rest.partition(".")
+        if not column or op not in COMPARISONS:
+            raise FakeAPIError(f"failed to parse logic tree ({text})", "PGRST100")
+        conditions.append((column, op, _parse_value(value)))
+    return kind, conditions
+
+def _evaluate(tree: tuple, row: dict) -> bool:
+    kind, conditions = tree
+    results = (
+        _evaluate(condition, row) if len(condition) == 2 else _compare(row, *condition)
+        for condition in conditions
+    )
+    return all(results) if kind == "and" else any(results)
+
+# Сравнение со значением столбца; литерал приводится к типу столбца, NULL не проходит ни одно условие
+def _compare(row: dict, column: str, op: str, value: Any) -> bool:
+    current = row.get(column)
+    if current is None:
+        return False
+    if isinstance(current, (int, float)) and not isinstance(current, bool) and isinstance(value, str):
+        value = float(value)
+    elif isinstance(current, str) and not isinstance(value, str):
+        value = str(value).lower() if isinstance(value, bool) else str(value)
+    return COMPARISONS[op](current, value)
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.payload: Optional[dict] = None
+        self.filters: List[tuple] = []
+        self.logic: List[tuple] = []
+        self.ordering: List[tuple] = []
+        self.row_limit: Optional[int] = None
+        self.single_row = False
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+
+    def select(self, *columns: str, **kwargs):
+        self.operation = "select"
+        return self
+
+    def insert(self, payload):
+        self.operation = "insert"
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, *, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.operation = "upsert"
+        self.payload = payload
+        self.on_conflict = on_conflict or UNIQUE_COLUMNS.get(self.table)
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload: dict):
+        self.operation = "update"
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append((column, value))
+        return self
+
+    def in_(self, column: str, values: list):
+        self.filters.append((column, tuple(values)))
+        return self
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        self.logic.append(parse_logic("or", filters))
+        return self
+
+    def order(self, column: str, *, desc: bool = False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self.row_limit = size
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        return all(
+            row.get(column) in value if isinstance(value, tuple) else row.get(column) == value
+            for column, value in self.filters
+        ) and all(_evaluate(tree, row) for tree in self.logic)
+
+    def _insert(self, rows: List[dict]) -> List[dict]:
+        payload = [dict(row) for row in (self.payload if isinstance(self.payload, list) else [self.payload])]
+        key = self.on_conflict if self.operation == "upsert" else UNIQUE_COLUMNS.get(self.table)
+        existing = {row.get(key): row for row in rows} if key else {}
+
+        written = []
+        for row in payload:
+            current = existing.get(row.get(key)) if key else None
+            if current is None:
+                rows.append(row)
+                if key:
+                    existing[row.get(key)] = row
+            elif self.operation == "insert":
+                raise FakeAPIError(f"duplicate key value violates unique constraint ({key})", "23505")
+            elif self.ignore_duplicates:
+                continue
+            else:
+                current.update(row)
+                row = current
+            written.append(dict(row))
+        return written
+
+    async def execute(self) -> FakeResponse:
+        await self.client._round_trip()
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.operation in ("insert", "upsert"):
+            return FakeResponse(self._insert(rows))
+
+        matched = [row for row in rows if self._matches(row)]
+
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+        elif self.operation == "delete":
+            self.client.tables[self.table] = [row for row in rows if not self._matches(row)]
+
+        result = [dict(row) for row in matched]
+        for column, desc in reversed(self.ordering):
+            result.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.row_limit is not None:
+            result = result[:self.row_limit]
+        if self.single_row:
+            return FakeResponse(result[0] if result else None)
+        return FakeResponse(result)
+
+class FakeRpc:
+    def __init__(self, client: "FakeSupabase", function: str, params: dict):
+        self.client = client
+        self.function = function
+        self.params = params
+
+    # Повторяет adjust_conference_users.sql и adjust_conference_users_batch.sql.
+    # Для неизвестной функции — ответ с ошибкой, как у PostgREST (404, PGRST202)
+    async def execute(self) -> FakeResponse:
+        await self.client._round_trip()
+        if self.function == "adjust_conference_users":
+            deltas = {self.params["p_room_id"]: self.params["p_delta"]}
+        elif self.function == "adjust_conference_users_batch":
+            # Пара (p_batch_id, room_id) применяется один раз
+            deltas = {}
+            for room_id, delta in zip(self.params["p_room_ids"], self.params["p_deltas"]):
+                key = (self.params["p_batch_id"], room_id)
+                if key not in self.client.applied_batches:
+                    self.client.applied_batches.add(key)
+                    deltas[room_id] = delta
+        else:
+            return FakeResponse(None, {
+                "code": "PGRST202",
+                "message": f"Could not find the function public.{self.function} in the schema cache",
+                "details": None,
+                "hint": None,
+            })
+
+        updated = []
+        for row in self.client.tables.get("conferences", []):
+            if row["room_id"] in deltas and row["active"]:
+                users = row["users"] + deltas[row["room_id"]]
+                row["users"] = max(users, 0)
+                row["active"] = users > 0
+                updated.append(dict(row))
+        return FakeResponse(updated)
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {}
+        self.applied_batches: Set[Tuple[str, str]] = set()
+        self.requests = 0
+
+    async def _round_trip(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, function: str, params: Optional[dict] = None) -> FakeRpc:
+        return FakeRpc(self, function, params or {})
@@ -0,0 +1,382 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+import uuid
+import httpx
+import websockets
+from conferences.src.streaming.framing import (
+    FRAME_BATCH_SUBPROTOCOL, FRAME_SUBPROTOCOL, HEADER_SIZE, Channel, ControlOp, encode_frame, encode_pong, parse_header,
+)
+from conferences.src.streaming.recorder import RecordingReader
+from conferences.src.streaming.subscriber import BATCH_LENGTH_PREFIX
+
+# Нагрузочный тест signal-сервера и REST-маршрутов.
+# Поднимает приложение (benchmarks/serve.py) с FakeSupabase в отдельном процессе, подключает
+# rooms x clients WebSocket-клиентов, которые шлют кадры с заданным размером и частотой,
+# и выводит результаты в JSON для сравнения запусков (benchmarks/compare.py).
+# С --corpus отправители повторяют размеры, каналы и интервалы кадров из записи реальной комнаты
+
+# Время отправки кадра в начале полезной нагрузки, нс (perf_counter_ns одного хоста)
+TIMESTAMP = struct.Struct("!Q")
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def latency_summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.5),
+        "p99_ms": percentile(values, 0.99),
+        "max_ms": max(values) if values else None,
+    }
+
+# Resident set size процесса сервера (только Linux)
+def rss_bytes(pid: Optional[int]) -> Optional[int]:
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/metrics")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Сервер {base_url} не запустился за {timeout} с")
+
+# Клиент комнаты: считает полученные кадры и задержку доставки
+class RoomClient:
+    def __init__(self, protocol: str):
+        self.protocol = protocol
+        self.websocket = None
+        self.sender_id = 0
+        self.sequence = 0
+        self.received_frames = 0
+        self.received_bytes = 0
+        self.latencies_ms: List[float] = []
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self, ws_url: str, room_id: str):
+        subprotocols = {"framed": [FRAME_SUBPROTOCOL], "batch": [FRAME_BATCH_SUBPROTOCOL]}.get(self.protocol)
+        self.websocket = await websockets.connect(
+            f"{ws_url}/ws/{room_id}",
+            subprotocols=subprotocols,
+            max_size=None,
+            compression=None,
+        )
+        if self.protocol != "legacy":
+            # Первым приходит WELCOME с назначенным id
+            for frame in self._split(await self.websocket.recv()):
+                if parse_header(frame) and frame[HEADER_SIZE] == ControlOp.WELCOME:
+                    self.sender_id = int.from_bytes(frame[HEADER_SIZE + 1:HEADER_SIZE + 5], "big")
+        self._reader = asyncio.create_task(self._read())
+
+    def _split(self, message: bytes) -> List[bytes]:
+        if self.protocol != "batch":
+            return [message]
+        frames = []
+        offset = 0
+        while offset < len(message):
+            (length,) = BATCH_LENGTH_PREFIX.unpack_from(message, offset)
+            offset += BATCH_LENGTH_PREFIX.size
+            frames.append(message[offset:offset + length])
+            offset += length
+        return frames
+
+    async def _read(self):
+        payload_offset = 0 if self.protocol == "legacy" else HEADER_SIZE
+        try:
+            async for message in self.websocket:
+                now = time.perf_counter_ns()
+                for frame in self._split(message):
+                    if payload_offset and frame[1] == Channel.CONTROL:
+                        if frame[HEADER_SIZE] == ControlOp.PING:
+                            await self.websocket.send(encode_pong(self.sender_id))
+                        continue
+                    (sent_at,) = TIMESTAMP.unpack_from(frame, payload_offset)
+                    self.latencies_ms.append((now - sent_at) / 1e6)
+                    self.received_frames += 1
+                    self.received_bytes += len(frame)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def send(self, frame_size: int, channel: Channel = Channel.VIDEO):
+        payload = TIMESTAMP.pack(time.perf_counter_ns()).ljust(frame_size, b"\0")
+        if self.protocol == "legacy":
+            await self.websocket.send(payload)
+        else:
+            self.sequence += 1
+            await self.websocket.send(encode_frame(channel, self.sender_id, self.sequence, payload))
+
+    async def close(self):
+        await self.websocket.close()
+        if self._reader is not None:
+            await self._reader
+
+async def run_sender(client: RoomClient, frame_size: int, rate: float, duration: float) -> int:
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - started < duration:
+        await client.send(frame_size)
+        sent += 1
+        # Расписание без накопления дрейфа
+        delay = started + sent * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return sent
+
+# Кадр записи: смещение от начала записи отправителя (с), размер полезной нагрузки, канал
+CorpusFrame = Tuple[float, int, Channel]
+
+# Расписания отправителей из записи комнаты (<RECORDING_DIR>/<room_id>).
+# Служебные кадры сервера и управляющие кадры пропускаются
+def load_corpus(path: str) -> List[List[CorpusFrame]]:
+    path = os.path.abspath(path)
+    reader = RecordingReader(os.path.dirname(path), os.path.basename(path))
+    frames: Dict[int, List[Tuple[int, int, Channel]]] = {}
+    for frame in reader.frames():
+        if frame.channel == Channel.CONTROL or frame.sender_id == 0:
+            continue
+        size = len(frame.payload) - (0 if frame.channel is None else HEADER_SIZE)
+        frames.setdefault(frame.sender_id, []).append((frame.timestamp, size, Channel.VIDEO if frame.channel is None else frame.channel))
+    if not frames:
+        raise SystemExit(f"В записи {path} нет кадров участников")
+
+    return [
+        [((timestamp - recorded[0][0]) / 1000, max(size, TIMESTAMP.size), channel) for timestamp, size, channel in recorded]
+        for recorded in frames.values()
+    ]
+
+# Повтор расписания из записи по кругу, пока не истечет duration
+async def run_corpus_sender(client: RoomClient, schedule: List[CorpusFrame], duration: float) -> int:
+    # Пауза перед повтором — средний интервал записи
+    period = schedule[-1][0] + (schedule[-1][0] / (len(schedule) - 1) if len(schedule) > 1 else 0.1)
+    started = time.perf_counter()
+    sent = 0
+    repeat = 0
+    while True:
+        for offset, size, channel in schedule:
+            at = started + repeat * period + offset
+            if at - started >= duration:
+                return sent
+            delay = at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await client.send(size, channel)
+            sent += 1
+        repeat += 1
+
+# Кадры, отброшенные лимитами сервера, по счетчикам комнат (комнаты должны быть еще открыты)
+async def rate_limited_frames(base_url: str, room_ids: List[str]) -> Optional[int]:
+    total = 0
+    async with httpx.AsyncClient() as client:
+        for room_id in room_ids:
+            response = await client.get(f"{base_url}/room_stats/{room_id}")
+            if response.status_code != 200:
+                return None
+            total += response.json()["rate_limited_frames"]
+    return total
+
+async def websocket_benchmark(args, base_url: str, server_pid: Optional[int]) -> dict:
+    ws_url = base_url.replace("http", "ws", 1)
+    rss_before = rss_bytes(server_pid)
+    rooms: List[List[RoomClient]] = []
+    room_ids: List[str] = []
+    for _ in range(args.rooms):
+        room_id = uuid.uuid4().hex
+        clients = [RoomClient(args.protocol) for _ in range(args.clients)]
+        await asyncio.gather(*[client.connect(ws_url, room_id) for client in clients])
+        rooms.append(clients)
+        room_ids.append(room_id)
+
+    connections = args.rooms * args.clients
+    rss_connected = rss_bytes(server_pid)
+
+    senders = [client for clients in rooms for client in clients[:args.senders]]
+    corpus = load_corpus(args.corpus) if args.corpus else None
+    started = time.perf_counter()
+    if corpus is not None:
+        sent = sum(await asyncio.gather(*[
+            run_corpus_sender(client, corpus[index % len(corpus)], args.duration) for index, client in enumerate(senders)
+        ]))
+    else:
+        sent = sum(await asyncio.gather(*[
+            run_sender(client, args.frame_size, args.rate, args.duration) for client in senders
+        ]))
+    elapsed = time.perf_counter() - started
+
+    # Досылка кадров, оставшихся в очередях сервера
+    await asyncio.sleep(args.drain)
+    rss_loaded = rss_bytes(server_pid)
+    rate_limited = await rate_limited_frames(base_url, room_ids)
+
+    clients = [client for room in rooms for client in room]
+    await asyncio.gather(*[client.close() for client in clients])
+
+    latencies = [latency for client in clients for latency in client.latencies_ms]
+    received = sum(client.received_frames for client in clients)
+    expected = sent * (args.clients - 1)
+
+    return {
+        "connections": connections,
+        "sent_frames": sent,
+        "expected_deliveries": expected,
+        "received_frames": received,
+        "delivery_ratio": received / expected if expected else None,
+        "rate_limited_frames": rate_limited,
+        "received_frames_per_sec": received / elapsed,
+        "received_bytes_per_sec": sum(client.received_bytes for client in clients) / elapsed,
+        "fanout_latency": latency_summary(latencies),
+        "rss_before_bytes": rss_before,
+        "rss_connected_bytes": rss_connected,
+        "rss_loaded_bytes": rss_loaded,
+        "rss_per_connection_bytes": (
+            (rss_connected - rss_before) / connections if rss_before and rss_connected else None
+        ),
+    }
+
+async def timed(latencies: Dict[str, List[float]], route: str, request) -> httpx.Response:
+    started = time.perf_counter()
+    response = await request
+    latencies.setdefault(route, []).append((time.perf_counter() - started) * 1000)
+    return response
+
+async def rest_benchmark(args, base_url: str) -> dict:
+    latencies: Dict[str, List[float]] = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(args.rest_concurrency)
+    creator = str(uuid.uuid4())
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        async def scenario(index: int):
+            nonlocal errors
+            async with semaphore:
+                response = await timed(latencies, "create_conference", client.post(
+                    "/create_conference", json={"name": f"bench-{index}", "created_by": creator}
+                ))
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                room_id = response.json()["room_id"]
+                for route, request in (
+                    ("join_conference", client.get(f"/join_conference/{room_id}")),
+                    ("list_conferences", client.get("/list_conferences", params={"created_by": creator})),
+                    ("leave_conference", client.post(f"/leave_conference/{room_id}")),
+                ):
+                    if (await timed(latencies, route, request)).status_code != 200:
+                        errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[scenario(index) for index in range(args.rest_requests)])
+        elapsed = time.perf_counter() - started
+
+    requests = sum(len(values) for values in latencies.values())
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_sec": requests / elapsed,
+        "latency": {route: latency_summary(values) for route, values in latencies.items()},
+    }
+
+def start_server(args, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    # Весь трафик теста идет с одного IP, а нагрузка задается параметрами теста:
+    # лимиты частоты, кадров и размера комнат отключаются, если не заданы явно
+    for name in (
+        "RATE_LIMIT_CREATE_IP", "RATE_LIMIT_CREATE_USER", "RATE_LIMIT_JOIN_IP", "RATE_LIMIT_JOIN_ROOM", "WS_CONNECT_IP_LIMIT",
+        "WS_FRAMES_LIMIT", "WS_BYTES_LIMIT", "WS_ROOM_FRAMES_LIMIT", "WS_ROOM_CAPACITY",
+    ):
+        env.setdefault(name, "0")
+    if args.protocol == "batch":
+        env["WS_BATCHING"] = "1"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(port), "--db-latency-ms", str(args.db_latency_ms)],
+        cwd=root,
+        env=env,
+    )
+
+async def run(args) -> dict:
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        server_pid = args.server_pid
+    else:
+        port = free_port()
+        server = start_server(args, port)
+        base_url = f"http://127.0.0.1:{port}"
+        server_pid = server.pid
+
+    try:
+        await wait_ready(base_url)
+        result = {
+            "timestamp": time.time(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+        }
+        if args.rooms:
+            result["websocket"] = await websocket_benchmark(args, base_url, server_pid)
+        if args.rest_requests:
+            result["rest"] = await rest_benchmark(args, base_url)
+        return result
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Signal server and REST load test")
+    parser.add_argument("--url", help="Use an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of --url server for RSS measurements")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=5, help="WebSocket clients per room")
+    parser.add_argument("--senders", type=int, default=1, help="Clients per room that send frames")
+    parser.add_argument("--frame-size", type=int, default=1200, help="Payload bytes per frame")
+    parser.add_argument("--rate", type=float, default=30.0, help="Frames per second per sender")
+    parser.add_argument("--corpus", help="Recorded room directory (<RECORDING_DIR>/<room_id>) replayed instead of --frame-size/--rate")
+    parser.add_argument("--duration", type=float, default=10.0, help="Sending time, seconds")
+    parser.add_argument("--drain", type=float, default=1.0, help="Wait for in-flight frames, seconds")
+    parser.add_argument("--protocol", choices=("legacy", "framed", "batch"), default="framed")
+    parser.add_argument("--rest-requests", type=int, default=200, help="create/join/list/leave scenarios")
+    parser.add_argument("--rest-concurrency", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Simulated Supabase round trip")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+import uuid
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from conferences.src.repository.serialization import dumps, orjson
+from conferences.src.schema.create_conference import ConferenceResponse
+
+# Микробенчмарк сериализации ответов: стандартный путь FastAPI (валидация response_model,
+# jsonable_encoder, json.dumps) против быстрого пути (model_construct, сериализатор
+# pydantic-core, orjson). Результаты выводятся в JSON, как у run_benchmark.py
+
+def conference_row(index: int) -> dict:
+    return {
+        "room_id": uuid.uuid4().hex * 2,
+        "name": f"Конференция {index}",
+        "link": f"127.0.0.1/join/{uuid.uuid4().hex}",
+        "active": True,
+        "users": index % 50,
+        "created_by": str(uuid.uuid4()),
+    }
+
+# Среднее время одного вызова, микросекунды
+def measure(function: Callable[[], object], repeat: int) -> float:
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+async def measure_async(function: Callable[[], Awaitable[object]], repeat: int) -> float:
+    await function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization microbenchmark")
+    parser.add_argument("--rows", type=int, default=500, help="Rows per list page")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    row = conference_row(0)
+    rows = [conference_row(index) for index in range(args.rows)]
+    field = create_model_field("response", ConferenceResponse, mode="serialization")
+
+    # Ответ create_conference: модель с валидацией response_model и без нее
+    async def model_default():
+        model = ConferenceResponse(**row)
+        content = await serialize_response(field=field, response_content=model)
+        return JSONResponse(content).body
+
+    def model_fast():
+        model = ConferenceResponse.model_construct(**row)
+        return model.__pydantic_serializer__.to_json(model)
+
+    # Страница list_conferences: JSONResponse со стандартным json и orjson
+    def list_default():
+        return JSONResponse(rows).body
+
+    def list_fast():
+        return dumps(rows)
+
+    assert json.loads(asyncio.run(model_default())) == json.loads(model_fast())
+    assert json.loads(list_default()) == json.loads(list_fast())
+
+    list_repeat = max(args.repeat // 20, 10)
+    result = {
+        "config": {"rows": args.rows, "repeat": args.repeat, "orjson": orjson is not None},
+        "model_us": {
+            "default": asyncio.run(measure_async(model_default, args.repeat)),
+            "fast": measure(model_fast, args.repeat),
+        },
+        "list_page_us": {
+            "default": measure(list_default, list_repeat),
+            "fast": measure(list_fast, list_repeat),
+        },
+    }
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import argparse
+import uvicorn
+from app import app
+from benchmarks.fake_supabase import FakeSupabase
+from conferences.database.database_repository import get_supabase
+from conferences.database.write_behind import write_behind
+
+# Запуск приложения для нагрузочного теста: Supabase заменен на FakeSupabase
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with an in-memory Supabase stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Simulated Supabase round trip")
+    args = parser.parse_args()
+
+    fake = FakeSupabase(latency=args.db_latency_ms / 1000)
+    app.dependency_overrides[get_supabase] = lambda: fake
+    if write_behind is not None:
+        async def get_fake():
+            return fake
+        write_behind.get_client = get_fake
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+import json
+import logging
+import os
+import time
+from typing import Any, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Счетчики попаданий и промахов кэша
+@dataclass
+class CacheStats:
+    conference_hits: int = 0
+    conference_misses: int = 0
+    list_hits: int = 0
+    list_misses: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+# LRU-словарь с ограничением времени жизни записей
+class TTLCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# Кэш строк конференций (по room_id) и страниц list_conferences (по фильтру и параметрам страницы).
+# Записи сбрасываются при любых изменениях конференций, включая счетчики участников
+class ConferenceCache(ABC):
+    def __init__(self):
+        self.stats = CacheStats()
+
+    async def get_conference(self, room_id: str) -> Optional[dict]:
+        value = await self._get_conference(room_id)
+        if value is None:
+            self.stats.conference_misses += 1
+        else:
+            self.stats.conference_hits += 1
+        return value
+
+    async def get_list(self, key: str) -> Optional[list]:
+        value = await self._get_list(key)
+        if value is None:
+            self.stats.list_misses += 1
+        else:
+            self.stats.list_hits += 1
+        return value
+
+    async def set_list(self, key: str, rows: list):
+        await self._set_list(key, rows)
+
+    # Сброс записи конференции и всех списков, в которые она могла попасть
+    async def invalidate(self, room_id: str):
+        self.stats.invalidations += 1
+        await self.invalidate_conference(room_id)
+        await self.invalidate_lists()
+
+    @abstractmethod
+    async def _get_conference(self, room_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def set_conference(self, room_id: str, row: dict):
+        ...
+
+    @abstractmethod
+    async def invalidate_conference(self, room_id: str):
+        ...
+
+    @abstractmethod
+    async def _get_list(self, key: str) -> Optional[list]:
+        ...
+
+    @abstractmethod
+    async def _set_list(self, key: str, rows: list):
+        ...
+
+    @abstractmethod
+    async def invalidate_lists(self):
+        ...
+
+    async def close(self):
+        pass
+
+# Кэш в памяти процесса
+class InMemoryConferenceCache(ConferenceCache):
+    def __init__(self, ttl: float, max_size: int):
+        super().__init__()
+        self.conferences = TTLCache(ttl, max_size)
+        self.lists = TTLCache(ttl, max_size)
+
+    async def _get_conference(self, room_id: str) -> Optional[dict]:
+        return self.conferences.get(room_id)
+
+    async def set_conference(self, room_id: str, row: dict):
+        self.conferences.set(room_id, row)
+
+    async def invalidate_conference(self, room_id: str):
+        self.conferences.delete(room_id)
+
+    async def _get_list(self, key: str) -> Optional[list]:
+        return self.lists.get(key)
+
+    async def _set_list(self, key: str, rows: list):
+        self.lists.set(key, rows)
+
+    async def invalidate_lists(self):
+        self.lists.clear()
+
+# Общий кэш для нескольких процессов и узлов в Redis.
+# Списки хранятся в одном хэше, поэтому сбрасываются одной командой DEL.
+# Ошибки Redis не прерывают запрос: обращение считается промахом
+class RedisConferenceCache(ConferenceCache):
+    def __init__(self, ttl: float, url: Optional[str] = None, client=None, prefix: str = "conferences_cache:"):
+        super().__init__()
+
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("Для RedisConferenceCache требуется пакет redis") from e
+            client = redis.from_url(url)
+
+        self.client = client
+        self.ttl = max(int(ttl), 1)
+        self.prefix = prefix
+        self.lists_key = f"{prefix}lists"
+
+    def _conference_key(self, room_id: str) -> str:
+        return f"{self.prefix}conference:{room_id}"
+
+    async def _get_conference(self, room_id: str) -> Optional[dict]:
+        try:
+            value = await self.client.get(self._conference_key(room_id))
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def set_conference(self, room_id: str, row: dict):
+        try:
+            await self.client.set(self._conference_key(room_id), json.dumps(row), ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи в кэш: {e}")
+
+    async def invalidate_conference(self, room_id: str):
+        try:
+            await self.client.delete(self._conference_key(room_id))
+        except Exception as e:
+            logger.error(f"Ошибка сброса кэша: {e}")
+
+    async def _get_list(self, key: str) -> Optional[list]:
+        try:
+            value = await self.client.hget(self.lists_key, key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def _set_list(self, key: str, rows: list):
+        try:
+            await self.client.hset(self.lists_key, key, json.dumps(rows))
+            await self.client.expire(self.lists_key, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи в кэш: {e}")
+
+    async def invalidate_lists(self):
+        try:
+            await self.client.delete(self.lists_key)
+        except Exception as e:
+            logger.error(f"Ошибка сброса кэша: {e}")
+
+    async def close(self):
+        await self.client.aclose()
+
+# Создание кэша по CACHE_URL: redis://... — общий кэш в Redis, иначе кэш в памяти процесса
+def create_cache() -> ConferenceCache:
+    ttl = float(os.getenv("CACHE_TTL", "30"))
+    url = os.getenv("CACHE_URL")
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisConferenceCache(ttl, url)
+    return InMemoryConferenceCache(ttl, int(os.getenv("CACHE_MAX_SIZE", "10000")))
+
+conference_cache = create_cache()
+
+# Зависимость FastAPI: возвращает общий кэш конференций
+def get_cache() -> ConferenceCache:
+    return conference_cache
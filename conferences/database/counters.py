@@ -0,0 +1,17 @@
+from typing import Optional
+from supabase import AsyncClient
+
+# Имя серверной функции из conferences/database/sql/adjust_conference_users.sql
+ADJUST_USERS_FUNCTION = "adjust_conference_users"
+
+# Атомарное изменение числа участников за один запрос к Supabase.
+# Возвращает обновленную строку конференции или None, если она не найдена или не активна
+async def adjust_users(supabase: AsyncClient, room_id: str, delta: int) -> Optional[dict]:
+    response = await supabase.rpc(ADJUST_USERS_FUNCTION, {
+        "p_room_id": room_id,
+        "p_delta": delta
+    }).execute()
+
+    if not response.data:
+        return None
+    return response.data[0]
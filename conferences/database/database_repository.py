@@ -1,14 +1,122 @@
+import asyncio
 import hashlib
 import os
+from typing import Dict, Optional, Union
 from dotenv import load_dotenv
-from supabase import Client, create_client
+import httpx
+from postgrest import AsyncPostgrestClient
+from supabase import AsyncClient, AsyncClientOptions
+from conferences.src.monitoring.tracing import tracer
 
 load_dotenv()
 
-# Подключение к Supabase
-def get_supabase() -> Client:
-    return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+# Параметры пула HTTP-соединений к Supabase
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+
+# Транспорт httpx, который оборачивает каждый запрос к Supabase в отрезок трассировки.
+# Тело ответа читается внутри отрезка, чтобы в него попадало все время ожидания базы
+class TracingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # /rest/v1/conferences, /rest/v1/rpc/adjust_conference_users, ...
+        target = request.url.path.rsplit("/rest/v1/", 1)[-1]
+        with tracer.span(f"db {request.method} {target}", method=request.method, target=target) as span:
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+            span.set("status_code", response.status_code)
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+# PostgREST-клиент с ограниченным пулом keep-alive соединений
+class PooledPostgrestClient(AsyncPostgrestClient):
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_POOL_SIZE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+        )
+        # При трассировке тот же пул соединений оборачивается в TracingTransport
+        transport = None
+        if tracer.enabled:
+            transport = TracingTransport(
+                httpx.AsyncHTTPTransport(verify=verify, http2=True, limits=limits, proxy=proxy)
+            )
+
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy if transport is None else None,
+            follow_redirects=True,
+            http2=True,
+            limits=limits,
+            transport=transport,
+        )
+
+# Асинхронный клиент Supabase, выполняющий запросы к таблицам через общий пул соединений
+class PooledAsyncClient(AsyncClient):
+    @staticmethod
+    def _init_postgrest_client(
+        rest_url: str,
+        headers: Dict[str, str],
+        schema: str,
+        timeout: Union[int, float, httpx.Timeout] = SUPABASE_TIMEOUT,
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> AsyncPostgrestClient:
+        return PooledPostgrestClient(
+            rest_url,
+            headers=headers,
+            schema=schema,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+        )
+
+_supabase: Optional[AsyncClient] = None
+_supabase_lock = asyncio.Lock()
+
+# Подключение к Supabase: один клиент на время жизни приложения
+async def init_supabase() -> AsyncClient:
+    global _supabase
+    async with _supabase_lock:
+        if _supabase is None:
+            _supabase = await PooledAsyncClient.create(
+                os.getenv("SUPABASE_URL"),
+                os.getenv("SUPABASE_KEY"),
+                AsyncClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+            )
+    return _supabase
+
+# Закрытие пула соединений при остановке приложения
+async def close_supabase():
+    global _supabase
+    async with _supabase_lock:
+        if _supabase is not None:
+            await _supabase.postgrest.aclose()
+            _supabase = None
+
+# Зависимость FastAPI: возвращает общий клиент Supabase
+async def get_supabase() -> AsyncClient:
+    with tracer.span("dependency get_supabase"):
+        if _supabase is not None:
+            return _supabase
+        return await init_supabase()
 
 # Хэширование идентификатора комнаты конференции
 def hash_room_id(room_id: str) -> str:
-    return hashlib.sha256(room_id.encode()).hexdigest()
\ No newline at end of file
+    return hashlib.sha256(room_id.encode()).hexdigest()
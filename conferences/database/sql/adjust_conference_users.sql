@@ -0,0 +1,15 @@
+-- Атомарное изменение числа участников конференции.
+-- Выполняется одним UPDATE: строка блокируется на время изменения, поэтому
+-- одновременные присоединения не теряют инкременты. Конференция деактивируется
+-- в том же запросе, когда участников не остается.
+-- Возвращает обновленную строку или пустой результат, если конференция не найдена или не активна.
+create or replace function adjust_conference_users(p_room_id text, p_delta integer)
+returns setof conferences
+language sql
+as $$
+    update conferences
+    set users = greatest(users + p_delta, 0),
+        active = users + p_delta > 0
+    where room_id = p_room_id and active
+    returning *;
+$$;
@@ -0,0 +1,38 @@
+-- Пакетное изменение числа участников нескольких конференций одним UPDATE.
+-- Используется отложенной записью (conferences/database/write_behind.py): p_deltas[i]
+-- применяется к p_room_ids[i] по тем же правилам, что и в adjust_conference_users.
+-- Изменение применяется один раз для пары (p_batch_id, room_id): повтор пачки после
+-- ошибки сети или восстановления журнала не меняет счетчик повторно.
+-- Возвращает обновленные строки.
+create table if not exists conference_applied_batches (
+    batch_id text not null,
+    room_id text not null,
+    applied_at timestamptz not null default now(),
+    primary key (batch_id, room_id)
+);
+
+create index if not exists conference_applied_batches_applied_at on conference_applied_batches (applied_at);
+
+drop function if exists adjust_conference_users_batch(text[], integer[]);
+
+create or replace function adjust_conference_users_batch(p_batch_id text, p_room_ids text[], p_deltas integer[])
+returns setof conferences
+language sql
+as $$
+    -- Пачки старше недели повторно не приходят
+    delete from conference_applied_batches where applied_at < now() - interval '7 days';
+
+    with fresh as (
+        insert into conference_applied_batches (batch_id, room_id)
+        select p_batch_id, room_id from unnest(p_room_ids) as r(room_id)
+        on conflict do nothing
+        returning room_id
+    )
+    update conferences c
+    set users = greatest(c.users + d.delta, 0),
+        active = c.users + d.delta > 0
+    from unnest(p_room_ids, p_deltas) as d(room_id, delta)
+    join fresh f on f.room_id = d.room_id
+    where c.room_id = d.room_id and c.active
+    returning c.*;
+$$;
@@ -0,0 +1,461 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO, Tuple
+import uuid
+from supabase import AsyncClient
+from conferences.database.cache import ConferenceCache
+from conferences.database.database_repository import get_supabase
+
+logger = logging.getLogger(__name__)
+
+# Имя серверной функции из conferences/database/sql/adjust_conference_users_batch.sql
+ADJUST_USERS_BATCH_FUNCTION = "adjust_conference_users_batch"
+
+# Изменение счетчика участников строки конференции, как в adjust_conference_users.sql.
+# None, если конференция не активна
+def apply_users_delta(row: dict, delta: int) -> Optional[dict]:
+    if not row.get("active"):
+        return None
+
+    users = row["users"] + delta
+    return {**row, "users": max(users, 0), "active": users > 0}
+
+# Накопленные и еще не записанные изменения одной конференции.
+# Несколько изменений схлопываются: поля обновления объединяются, изменения
+# счетчика участников суммируются, удаление отменяет все предыдущее
+@dataclass
+class PendingWrite:
+    insert: Optional[dict] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+    users_delta: int = 0
+    delete: bool = False
+
+    def update(self, fields: Dict[str, Any]):
+        if self.delete:
+            return
+        if self.insert is not None:
+            self.insert.update(fields)
+        else:
+            self.fields.update(fields)
+
+    # Принимаются только изменения, прошедшие проверку активности, поэтому сумма
+    # дает тот же результат, что и последовательное применение
+    def adjust(self, delta: int):
+        if self.delete:
+            return
+        if self.insert is not None:
+            self.insert = apply_users_delta(self.insert, delta) or self.insert
+        else:
+            self.users_delta += delta
+
+    # Применение более поздних изменений той же конференции. None — записывать нечего
+    def then(self, newer: "PendingWrite") -> Optional["PendingWrite"]:
+        if newer.delete:
+            return None if self.insert is not None else PendingWrite(delete=True)
+        if newer.insert is not None:
+            return newer
+
+        self.update(newer.fields)
+        self.adjust(newer.users_delta)
+        return self
+
+    def empty(self) -> bool:
+        return self.insert is None and not self.fields and not self.users_delta and not self.delete
+
+    # Строка из Supabase с учетом еще не записанных изменений
+    def overlay(self, row: Optional[dict]) -> Optional[dict]:
+        if self.delete:
+            return None
+        if self.insert is not None:
+            return dict(self.insert)
+        if row is None:
+            return None
+
+        row = {**row, **self.fields}
+        if self.users_delta:
+            row = apply_users_delta(row, self.users_delta) or row
+        return row
+
+    # Записи журнала, из которых собирается изменение (для отложенных в dead letter)
+    def records(self, room_id: str) -> List[dict]:
+        if self.delete:
+            return [{"op": "delete", "room_id": room_id}]
+
+        records = []
+        if self.insert is not None:
+            records.append({"op": "insert", "room_id": room_id, "row": self.insert})
+        if self.fields:
+            records.append({"op": "update", "room_id": room_id, "fields": self.fields})
+        if self.users_delta:
+            records.append({"op": "adjust", "room_id": room_id, "delta": self.users_delta})
+        return records
+
+# Счетчики очереди отложенной записи
+@dataclass
+class WriteBehindStats:
+    enqueued: int = 0
+    coalesced: int = 0
+    flushed_rows: int = 0
+    flushes: int = 0
+    flush_errors: int = 0
+    recovered: int = 0
+    dead_lettered: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+# Пачка изменений, отправляемая в Supabase, и сегменты журнала с ее записями.
+# Id пачки записывается в конец ее сегментов до первой попытки, поэтому после падения
+# пачка восстанавливается с тем же id и счетчики участников не применяются повторно
+@dataclass
+class Batch:
+    batch_id: str
+    changes: Dict[str, PendingWrite]
+    segments: List[Tuple[str, TextIO]] = field(default_factory=list)
+    attempts: int = 0
+
+def merge_change(changes: Dict[str, PendingWrite], room_id: str, change: PendingWrite) -> bool:
+    current = changes.pop(room_id, None)
+    if current is not None:
+        change = current.then(change)
+    if change is not None:
+        changes[room_id] = change
+    return current is not None
+
+def change_from_record(record: dict) -> PendingWrite:
+    change = PendingWrite()
+    if record["op"] == "insert":
+        change.insert = dict(record["row"])
+    elif record["op"] == "update":
+        change.fields = dict(record["fields"])
+    elif record["op"] == "adjust":
+        change.users_delta = record["delta"]
+    elif record["op"] == "delete":
+        change.delete = True
+    return change
+
+# Отложенная запись изменений конференций в Supabase.
+# Изменения сразу попадают в журнал на диске и в очередь, схлопываются по room_id и
+# записываются пачкой, когда в очереди набирается max_batch конференций или проходит
+# flush_interval секунд. Журнал разбит на сегменты: сегмент удаляется после успешной
+# записи всех его изменений, а сегменты упавшего процесса подхватываются при запуске.
+# Повтор пачки безопасен: создание идет через upsert без перезаписи существующей строки,
+# обновление и удаление идемпотентны, счетчики учитывают id пачки.
+# Пачка, не записанная за max_retries попыток, записывается по одной конференции,
+# а конференции, которые так и не удалось записать, уходят в журнал dead_letter
+class WriteBehind:
+    def __init__(
+        self,
+        journal_dir: str,
+        max_batch: int = 500,
+        flush_interval: float = 0.2,
+        fsync: bool = False,
+        max_retries: int = 5,
+        get_client: Callable[[], Awaitable[AsyncClient]] = get_supabase,
+    ):
+        self.journal_dir = journal_dir
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_retries = max_retries
+        self.get_client = get_client
+        self.stats = WriteBehindStats()
+        self.pending: Dict[str, PendingWrite] = {}
+        self._inflight: List[Batch] = []
+        self._segments: List[Tuple[str, TextIO]] = []
+        self._room_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # Восстановление журналов упавших процессов и запуск фоновой записи
+    async def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, "*.journal"))):
+            self._recover(path)
+        self._open_segment()
+        self._task = asyncio.create_task(self._run())
+        if self.pending or self._inflight:
+            logger.info(f"Восстановлено {self.stats.recovered} отложенных изменений конференций")
+            self._wakeup.set()
+
+    # Сегмент принадлежит живому процессу, пока тот держит на нем блокировку.
+    # Сегмент с id пачки возвращается в свою пачку, остальные — в очередь
+    def _recover(self, path: str):
+        journal = open(path, "a+")
+        try:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            journal.close()
+            return
+
+        journal.seek(0)
+        changes: Dict[str, PendingWrite] = {}
+        batch_id = None
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Последняя строка могла не дописаться при падении
+                continue
+            if record["op"] == "batch":
+                batch_id = record["batch_id"]
+                continue
+            merge_change(changes, record["room_id"], change_from_record(record))
+            self.stats.recovered += 1
+
+        if batch_id is None:
+            for room_id, change in changes.items():
+                self._merge(self.pending, room_id, change)
+            self._segments.append((path, journal))
+            return
+
+        batch = next((batch for batch in self._inflight if batch.batch_id == batch_id), None)
+        if batch is None:
+            batch = Batch(batch_id, {})
+            self._inflight.append(batch)
+        for room_id, change in changes.items():
+            self._merge(batch.changes, room_id, change)
+        batch.segments.append((path, journal))
+
+    # Имена сегментов упорядочены по времени создания и не повторяются между процессами
+    def _open_segment(self):
+        path = os.path.join(self.journal_dir, f"{time.time_ns():020d}-{os.getpid()}.journal")
+        journal = open(path, "a")
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        self._segments.append((path, journal))
+
+    def _write_record(self, journal: TextIO, record: dict):
+        journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        journal.flush()
+        if self.fsync:
+            os.fsync(journal.fileno())
+
+    def _merge(self, changes: Dict[str, PendingWrite], room_id: str, change: PendingWrite):
+        if merge_change(changes, room_id, change):
+            self.stats.coalesced += 1
+
+    def _enqueue(self, record: dict):
+        self._write_record(self._segments[-1][1], record)
+        self._merge(self.pending, record["room_id"], change_from_record(record))
+        self.stats.enqueued += 1
+        if len(self.pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def insert(self, row: dict):
+        self._enqueue({"op": "insert", "room_id": row["room_id"], "row": row})
+
+    async def update(self, room_id: str, fields: Dict[str, Any]):
+        self._enqueue({"op": "update", "room_id": room_id, "fields": fields})
+
+    async def delete(self, room_id: str):
+        self._enqueue({"op": "delete", "room_id": room_id})
+
+    # Строка конференции с учетом очереди: из кэша (в нем уже учтены изменения этого процесса)
+    # или из Supabase с наложением еще не записанных пачек и очереди
+    async def get_conference(self, cache: ConferenceCache, room_id: str) -> Optional[dict]:
+        row = await cache.get_conference(room_id)
+        if row is not None:
+            return row
+
+        supabase = await self.get_client()
+        response = await supabase.table("conferences").select("*").eq("room_id", room_id).execute()
+        row = response.data[0] if response.data else None
+
+        for batch in self._inflight:
+            change = batch.changes.get(room_id)
+            if change is not None:
+                row = change.overlay(row)
+        pending = self.pending.get(room_id)
+        return pending.overlay(row) if pending is not None else row
+
+    # Блокировка одной конференции: изменения разных комнат не ждут друг друга
+    @asynccontextmanager
+    async def _room_lock(self, room_id: str):
+        lock, users = self._room_locks.get(room_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._room_locks[room_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._room_locks[room_id]
+            if users == 1:
+                del self._room_locks[room_id]
+            else:
+                self._room_locks[room_id] = (lock, users - 1)
+
+    # Изменение числа участников без обращения к Supabase на запись: ответ строится по
+    # текущей строке, а в очередь попадает только принятое изменение.
+    # Возвращает новую строку или None, если конференция не найдена или не активна
+    async def adjust_users(self, cache: ConferenceCache, room_id: str, delta: int) -> Optional[dict]:
+        async with self._room_lock(room_id):
+            row = await self.get_conference(cache, room_id)
+            conference = apply_users_delta(row, delta) if row is not None else None
+            if conference is None:
+                return None
+
+            self._enqueue({"op": "adjust", "room_id": room_id, "delta": delta})
+            await cache.set_conference(room_id, conference)
+            return conference
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                self.stats.flush_errors += 1
+                logger.error(f"Ошибка записи изменений конференций: {e}")
+                # Повтор после обычной паузы, изменения остаются в очереди и журнале
+                await asyncio.sleep(self.flush_interval)
+
+    # Запись очереди в Supabase. Очередь становится пачкой с новым id; пачки пишутся по порядку,
+    # и при ошибке пачка повторяется целиком с тем же id, а новые изменения ждут в очереди
+    async def flush(self):
+        async with self._flush_lock:
+            if self.pending:
+                batch = Batch(uuid.uuid4().hex, self.pending, self._segments)
+                self.pending = {}
+                self._segments = []
+                self._open_segment()
+                for _, journal in batch.segments:
+                    self._write_record(journal, {"op": "batch", "batch_id": batch.batch_id})
+                self._inflight.append(batch)
+            elif len(self._segments) > 1:
+                # Восстановленные сегменты могли схлопнуться в пустую очередь
+                self._remove_segments(self._segments[:-1])
+                self._segments = self._segments[-1:]
+
+            while self._inflight:
+                batch = self._inflight[0]
+                rows = len(batch.changes)
+                try:
+                    await self._write(batch.batch_id, batch.changes)
+                except Exception:
+                    batch.attempts += 1
+                    if batch.attempts < self.max_retries:
+                        raise
+                    await self._write_each(batch)
+
+                self._inflight.pop(0)
+                self.stats.flushes += 1
+                self.stats.flushed_rows += rows
+                self._remove_segments(batch.segments)
+
+    # Последняя попытка пачки: конференции пишутся по одной, чтобы одна ошибочная
+    # не задерживала остальные; незаписанные сохраняются в dead_letter
+    async def _write_each(self, batch: Batch):
+        failed = {}
+        for room_id, change in list(batch.changes.items()):
+            try:
+                await self._write(batch.batch_id, {room_id: change})
+            except Exception as e:
+                logger.error(f"Изменение конференции {room_id} не записано: {e}")
+                failed[room_id] = change
+
+        if failed:
+            self._dead_letter(batch.batch_id, failed)
+
+    def _dead_letter(self, batch_id: str, changes: Dict[str, PendingWrite]):
+        directory = os.path.join(self.journal_dir, "dead_letter")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.time_ns():020d}-{os.getpid()}.journal")
+        with open(path, "a") as journal:
+            for room_id, change in changes.items():
+                for record in change.records(room_id):
+                    self._write_record(journal, {**record, "batch_id": batch_id})
+
+        self.stats.dead_lettered += len(changes)
+        logger.error(f"{len(changes)} изменений конференций сохранены в {path}")
+
+    def _remove_segments(self, segments: List[Tuple[str, TextIO]]):
+        for path, journal in segments:
+            journal.close()
+            os.remove(path)
+
+    # Записанная часть изменений сразу вычеркивается из пачки, чтобы после ошибки
+    # повторялся только остаток
+    async def _write(self, batch_id: str, changes: Dict[str, PendingWrite]):
+        supabase = await self.get_client()
+        table = supabase.table
+
+        inserted = [change for change in changes.values() if change.insert is not None]
+        if inserted:
+            # Строка, созданная прошлой попыткой пачки, не перезаписывается
+            await table("conferences").upsert(
+                [change.insert for change in inserted], on_conflict="room_id", ignore_duplicates=True
+            ).execute()
+            for change in inserted:
+                change.insert = None
+
+        for room_id, change in changes.items():
+            if change.fields:
+                await table("conferences").update(change.fields).eq("room_id", room_id).execute()
+                change.fields = {}
+
+        deltas = {room_id: change.users_delta for room_id, change in changes.items() if change.users_delta}
+        if deltas:
+            await supabase.rpc(ADJUST_USERS_BATCH_FUNCTION, {
+                "p_batch_id": batch_id,
+                "p_room_ids": list(deltas),
+                "p_deltas": list(deltas.values())
+            }).execute()
+            for room_id in deltas:
+                changes[room_id].users_delta = 0
+
+        deletes = [room_id for room_id, change in changes.items() if change.delete]
+        if deletes:
+            await table("conferences").delete().in_("room_id", deletes).execute()
+            for room_id in deletes:
+                changes[room_id].delete = False
+
+    # Остановка с записью оставшейся очереди
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Изменения конференций остались в журнале {self.journal_dir}: {e}")
+
+        # Пустой журнал больше не нужен, иначе он дождется следующего запуска
+        for path, journal in self._segments + [segment for batch in self._inflight for segment in batch.segments]:
+            journal.close()
+            if not self.pending and not self._inflight:
+                os.remove(path)
+        self._segments = []
+
+# Отложенная запись включается WRITE_BEHIND=1
+def create_write_behind() -> Optional[WriteBehind]:
+    if os.getenv("WRITE_BEHIND", "0") != "1":
+        return None
+
+    return WriteBehind(
+        journal_dir=os.getenv("WRITE_BEHIND_JOURNAL_DIR", "write_behind"),
+        max_batch=int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500")),
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "200")) / 1000,
+        fsync=os.getenv("WRITE_BEHIND_FSYNC", "0") == "1",
+        max_retries=int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5")),
+    )
+
+write_behind = create_write_behind()
+
+# Зависимость FastAPI: очередь отложенной записи или None, если она выключена
+def get_write_behind() -> Optional[WriteBehind]:
+    return write_behind
@@ -0,0 +1,14 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException
+
+# Токен администратора для служебных маршрутов; без него маршруты недоступны
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Зависимость FastAPI: пропускает запрос только с верным заголовком X-Admin-Token
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Служебные маршруты выключены")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
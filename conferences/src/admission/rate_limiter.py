@@ -0,0 +1,162 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Скорость пополнения (токенов в секунду) и емкость корзины
+@dataclass(frozen=True)
+class Limit:
+    rate: float
+    burst: float
+
+# Лимит из строки вида "30/m" или "200/s": N запросов за период, всплеск до N.
+# Пустая строка или 0 отключают лимит
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+def parse_limit(value: Optional[str]) -> Optional[Limit]:
+    if not value or value.strip() == "0":
+        return None
+
+    count, _, period = value.strip().partition("/")
+    seconds = PERIODS.get(period.strip() or "s")
+    if seconds is None:
+        raise ValueError(f"Некорректный лимит: {value}")
+    count = float(count)
+    return Limit(count / seconds, count) if count > 0 else None
+
+def limit_from_env(name: str, default: str) -> Optional[Limit]:
+    return parse_limit(os.getenv(name, default))
+
+# Корзина токенов. take возвращает 0, если токены списаны, иначе время до их появления
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, limit: Limit, now: float, cost: float = 1.0) -> float:
+        self.tokens = min(limit.burst, self.tokens + (now - self.updated) * limit.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / limit.rate
+
+# Отказы лимитера по областям (create_ip, join_room, ws_connect_ip, ...)
+class RateLimitStats:
+    def __init__(self):
+        self.rejected: Dict[str, int] = {}
+
+    def reject(self, scope: str):
+        self.rejected[scope] = self.rejected.get(scope, 0) + 1
+
+# Лимитер запросов по ключам вида "<область>:<ip|пользователь|комната>"
+class RateLimiter(ABC):
+    def __init__(self):
+        self.stats = RateLimitStats()
+
+    # 0 — запрос разрешен, иначе через сколько секунд можно повторить
+    async def acquire(self, scope: str, key: str, limit: Optional[Limit], cost: float = 1.0) -> float:
+        if limit is None:
+            return 0.0
+
+        retry_after = await self._acquire(f"{scope}:{key}", limit, cost)
+        if retry_after > 0:
+            self.stats.reject(scope)
+        return retry_after
+
+    @abstractmethod
+    async def _acquire(self, key: str, limit: Limit, cost: float) -> float:
+        ...
+
+    async def close(self):
+        pass
+
+# Корзины в памяти процесса; давно не использованные ключи вытесняются
+class InMemoryRateLimiter(RateLimiter):
+    def __init__(self, max_keys: int = 100000):
+        super().__init__()
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def _acquire(self, key: str, limit: Limit, cost: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit.burst, now)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(limit, now, cost)
+
+# Корзина в Redis: пополнение и списание одним Lua-скриптом по часам сервера Redis,
+# поэтому лимит общий для всех узлов и воркеров
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# Принимает готовый асинхронный клиент (например, fakeredis для локальной проверки).
+# При недоступности Redis запросы пропускаются: лимитер не должен останавливать сервис
+class RedisRateLimiter(RateLimiter):
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "rate_limit:"):
+        super().__init__()
+
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("Для RedisRateLimiter требуется пакет redis") from e
+            client = redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def _acquire(self, key: str, limit: Limit, cost: float) -> float:
+        try:
+            wait = await self._script(keys=[f"{self.prefix}{key}"], args=[limit.rate, limit.burst, cost])
+        except Exception as e:
+            logger.error(f"Ошибка лимитера запросов: {e}")
+            return 0.0
+        return float(wait)
+
+    async def close(self):
+        await self.client.aclose()
+
+# Создание лимитера по RATE_LIMIT_URL: redis://... — общий для узлов лимит в Redis, иначе в памяти
+def create_rate_limiter() -> RateLimiter:
+    url = os.getenv("RATE_LIMIT_URL")
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisRateLimiter(url)
+    return InMemoryRateLimiter(int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+
+rate_limiter = create_rate_limiter()
+
+# Зависимость FastAPI: возвращает общий лимитер запросов
+def get_rate_limiter() -> RateLimiter:
+    return rate_limiter
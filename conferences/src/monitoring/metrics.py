@@ -0,0 +1,87 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограммы задержки отправки (секунды)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Dict[str, str]
+
+# Гистограмма с фиксированными корзинами, как в Prometheus
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Приближенный квантиль: верхняя граница корзины, в которую он попадает
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Optional[Labels]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+# Сборщик метрик в текстовом формате Prometheus.
+# Значения одной метрики группируются вместе независимо от порядка добавления
+class PrometheusWriter:
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def _samples(self, name: str, kind: str, help_text: str) -> List[str]:
+        if name not in self._metrics:
+            self._metrics[name] = (kind, help_text, [])
+        return self._metrics[name][2]
+
+    def gauge(self, name: str, help_text: str, value: float, labels: Optional[Labels] = None):
+        self._samples(name, "gauge", help_text).append(f"{name}{_format_labels(labels)} {value}")
+
+    def counter(self, name: str, help_text: str, value: float, labels: Optional[Labels] = None):
+        self._samples(name, "counter", help_text).append(f"{name}{_format_labels(labels)} {value}")
+
+    def histogram(self, name: str, help_text: str, histogram: Histogram, labels: Optional[Labels] = None):
+        samples = self._samples(name, "histogram", help_text)
+        labels = labels or {}
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            samples.append(f"{name}_bucket{_format_labels({**labels, 'le': str(bound)})} {cumulative}")
+        samples.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+        samples.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        samples.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, samples) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
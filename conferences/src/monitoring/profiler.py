@@ -0,0 +1,50 @@
+from collections import Counter
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+# Предел длительности одного снятия профиля (секунды)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Семплирующий профилировщик: отдельный поток раз в interval секунд снимает стек
+# потока цикла событий через sys._current_frames и считает одинаковые стеки.
+# Результат — свернутые стеки ("функция;функция;... число"), которые принимают flamegraph.pl и speedscope.
+# Профилируемый поток не останавливается и не трассируется, поэтому профиль можно снимать на рабочем сервере
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    # Блокирующий вызов: запускается из пула потоков. None, если профиль уже снимается
+    def run(self, thread_id: int, seconds: float, interval: float) -> Optional[str]:
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stacks[self._collapse(frame)] += 1
+                time.sleep(interval)
+        finally:
+            self._lock.release()
+
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+profiler = SamplingProfiler()
@@ -0,0 +1,44 @@
+import logging
+import time
+from typing import Dict, Tuple
+
+# Логирование горячего пути с ограничением частоты: каждое событие (по ключу)
+# пишется не чаще раза в interval секунд, пропущенные записи учитываются в поле suppressed.
+# Поля выводятся в виде key=value, чтобы строки было удобно разбирать
+class RateLimitedLogger:
+    def __init__(self, logger: logging.Logger, interval: float = 10.0, max_keys: int = 1024):
+        self.logger = logger
+        self.interval = interval
+        self.max_keys = max_keys
+        self._state: Dict[Tuple[str, str], Tuple[float, int]] = {}
+
+    def log(self, level: int, event: str, key: str = "", **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = time.monotonic()
+        last, suppressed = self._state.get((event, key), (0.0, 0))
+        if now - last < self.interval:
+            self._state[(event, key)] = (last, suppressed + 1)
+            return
+
+        self._state[(event, key)] = (now, 0)
+        if len(self._state) > self.max_keys:
+            self._prune(now)
+
+        fields["suppressed"] = suppressed
+        self.logger.log(level, "%s %s", event, " ".join(f"{name}={value}" for name, value in fields.items()))
+
+    # Удаление ключей, интервал которых истек (например, закрытых комнат)
+    def _prune(self, now: float):
+        for state_key in [state_key for state_key, (last, _) in self._state.items() if now - last >= self.interval]:
+            del self._state[state_key]
+
+    def info(self, event: str, key: str = "", **fields):
+        self.log(logging.INFO, event, key, **fields)
+
+    def warning(self, event: str, key: str = "", **fields):
+        self.log(logging.WARNING, event, key, **fields)
+
+    def error(self, event: str, key: str = "", **fields):
+        self.log(logging.ERROR, event, key, **fields)
@@ -0,0 +1,241 @@
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+import importlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Отрезок работы внутри трассы. Время — Unix-время в наносекундах
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, start_ns: Optional[int] = None, **attributes: Any):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+# Получатель завершенных отрезков
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, span: Span):
+        ...
+
+    def close(self):
+        pass
+
+# Отрезки в лог приложения
+class LogExporter(SpanExporter):
+    def export(self, span: Span):
+        logger.info(f"span {span.name} {span.duration_ms:.3f}ms trace={span.trace_id} {span.attributes}")
+
+# Отрезки в файл построчно в JSON. Запись идет в буфер файла, на диск он сбрасывается
+# не чаще раза в flush_interval секунд, поэтому экспорт не добавляет системный вызов на каждый отрезок
+class FileExporter(SpanExporter):
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = open(path, "a", buffering=65536)
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def export(self, span: Span):
+        line = json.dumps(span.as_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            now = time.monotonic()
+            if now - self._flushed_at >= self.flush_interval:
+                self._file.flush()
+                self._flushed_at = now
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# Текущий отрезок задачи asyncio; UNSAMPLED — трасса не попала в выборку, вложенные отрезки не создаются
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+UNSAMPLED = Span("unsampled", "")
+
+# Текущий отрезок задачи: None вне трассы, UNSAMPLED — трасса не в выборке
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+# Контекст отрезка для with: отрезок становится текущим и экспортируется при выходе
+class SpanScope:
+    __slots__ = ("tracer", "span", "_token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        _current.reset(self._token)
+        if self.span is UNSAMPLED:
+            return
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.finish(self.span)
+
+# Контекст-заглушка при выключенной трассировке
+class NullScope:
+    __slots__ = ()
+
+    def __enter__(self) -> Span:
+        return UNSAMPLED
+
+    def __exit__(self, exc_type, exc, traceback):
+        pass
+
+NULL_SCOPE = NullScope()
+
+# Трассировка запросов. Отрезок без родителя начинает новую трассу, которая попадает
+# в выборку с вероятностью sample_rate; кадры WebSocket выбираются с вероятностью ws_sample_rate.
+# Без экспортера трассировка выключена и span() почти ничего не стоит
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 1.0, ws_sample_rate: float = 0.001):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.ws_sample_rate = ws_sample_rate
+        self.exported = 0
+        self.export_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def sample(self, rate: float) -> bool:
+        return self.enabled and random.random() < rate
+
+    def span(self, name: str, **attributes: Any):
+        if self.exporter is None:
+            return NULL_SCOPE
+
+        parent = _current.get()
+        if parent is UNSAMPLED:
+            return NULL_SCOPE
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return SpanScope(self, UNSAMPLED)
+            return SpanScope(self, Span(name, os.urandom(16).hex(), **attributes))
+        return SpanScope(self, Span(name, parent.trace_id, parent.span_id, **attributes))
+
+    # Отрезок с заранее известными границами (например, ожидание кадра в очереди подписчика)
+    def record(self, name: str, start_ns: int, end_ns: int, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        span = Span(
+            name,
+            parent.trace_id if parent is not None else os.urandom(16).hex(),
+            parent.span_id if parent is not None else None,
+            start_ns,
+            **attributes
+        )
+        span.end_ns = end_ns
+        self.export(span)
+        return span
+
+    def finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        self.export(span)
+
+    def export(self, span: Span):
+        exporter = self.exporter
+        if exporter is None:
+            return
+        try:
+            exporter.export(span)
+            self.exported += 1
+        except Exception as e:
+            self.export_errors += 1
+            logger.error(f"Ошибка экспорта трассировки: {e}")
+
+    # Отрезки, завершенные после остановки, не экспортируются
+    def close(self):
+        exporter, self.exporter = self.exporter, None
+        if exporter is not None:
+            exporter.close()
+
+# Экспортер по TRACING_EXPORTER: file (в TRACING_FILE), log или "модуль:фабрика" для своего экспортера
+def create_exporter(name: str) -> SpanExporter:
+    if name == "file":
+        return FileExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    if name == "log":
+        return LogExporter()
+
+    module_name, _, factory = name.partition(":")
+    if not factory:
+        raise RuntimeError(f"Неизвестный экспортер трассировки: {name}")
+    return getattr(importlib.import_module(module_name), factory)()
+
+def create_tracer() -> Tracer:
+    name = os.getenv("TRACING_EXPORTER", "")
+    return Tracer(
+        exporter=create_exporter(name) if name else None,
+        sample_rate=float(os.getenv("TRACING_SAMPLE_RATE", "1")),
+        ws_sample_rate=float(os.getenv("TRACING_WS_SAMPLE_RATE", "0.001")),
+    )
+
+tracer = create_tracer()
+
+# ASGI-middleware: корневой отрезок на каждый HTTP-запрос с шаблоном маршрута и кодом ответа.
+# Id трассы возвращается в заголовке X-Trace-Id
+class TracingMiddleware:
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}", method=scope["method"]) as span:
+            if span is UNSAMPLED:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set("status_code", message["status"])
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # Имя по шаблону маршрута, чтобы запросы к разным комнатам группировались
+                route = scope.get("route")
+                if route is not None and hasattr(route, "path"):
+                    span.name = f"{scope['method']} {route.path}"
@@ -0,0 +1,49 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+from conferences.src.schema.list_conferences import CONFERENCE_FIELDS
+
+# Разбор параметра fields: список колонок через запятую или None для всех колонок
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+
+    projection = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in projection if field not in CONFERENCE_FIELDS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    return projection
+
+# Курсор страницы: значение колонки сортировки и room_id последней строки
+def encode_cursor(row: dict, order_by: str) -> str:
+    payload = json.dumps([row[order_by], row["room_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, room_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError("Некорректный курсор") from e
+    return value, room_id
+
+# Экранирование значения для фильтров PostgREST внутри or=(...)
+def _quote(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+# Условие keyset-пагинации: строки строго после (value, room_id) в порядке сортировки
+def keyset_filter(order_by: str, value: Any, room_id: str, desc: bool) -> str:
+    op = "lt" if desc else "gt"
+    if order_by == "room_id":
+        return f"room_id.{op}.{_quote(room_id)}"
+    return f"{order_by}.{op}.{_quote(value)},and({order_by}.eq.{_quote(value)},room_id.{op}.{_quote(room_id)})"
+
+# Оставляет в строках только запрошенные колонки (колонки сортировки выбираются всегда)
+def project_rows(rows: List[dict], projection: Optional[List[str]]) -> List[dict]:
+    if projection is None:
+        return rows
+    return [{field: row.get(field) for field in projection} for row in rows]
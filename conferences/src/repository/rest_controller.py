@@ -1,25 +1,66 @@
 import logging
+import math
+from typing import Optional
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Query
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from supabase import AsyncClient
 from conferences.src.schema.delete_conference import DeleteConferenceRequest, DeleteConferenceResponse
 from conferences.src.schema.update_conference_name import UpdateConferenceNameRequest, UpdateConferenceNameResponse
+from conferences.database.cache import ConferenceCache, get_cache
+from conferences.database.counters import adjust_users
 from conferences.database.database_repository import get_supabase, hash_room_id
+from conferences.database.write_behind import WriteBehind, get_write_behind
+from conferences.src.admission.rate_limiter import Limit, RateLimiter, get_rate_limiter, limit_from_env
+from conferences.src.repository.pagination import decode_cursor, encode_cursor, keyset_filter, parse_fields, project_rows
+from conferences.src.monitoring.tracing import tracer
+from conferences.src.repository.serialization import FAST_JSON, TracedRoute, make_model, respond, rows_response
 from conferences.src.schema.create_conference import ConferenceRequest, ConferenceResponse
+from conferences.src.schema.list_conferences import ConferenceOrderBy, SortDirection
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Размер страницы list_conferences
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Лимиты частоты запросов на запись: с одного IP, от одного пользователя, в одну комнату
+CREATE_IP_LIMIT = limit_from_env("RATE_LIMIT_CREATE_IP", "30/m")
+CREATE_USER_LIMIT = limit_from_env("RATE_LIMIT_CREATE_USER", "10/m")
+JOIN_IP_LIMIT = limit_from_env("RATE_LIMIT_JOIN_IP", "120/m")
+JOIN_ROOM_LIMIT = limit_from_env("RATE_LIMIT_JOIN_ROOM", "50/s")
+
+# Ответ 429 с заголовком Retry-After, если лимит исчерпан
+async def enforce_rate_limit(limiter: RateLimiter, scope: str, key: str, limit: Optional[Limit]):
+    retry_after = await limiter.acquire(scope, key, limit)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много запросов, повторите позже",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
 # Создание новой конференции
 @router.post("/create_conference", response_model=ConferenceResponse)
 async def create_conference(
     conference: ConferenceRequest,
-    supabase: Client = Depends(get_supabase)
+    request: Request,
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache),
+    writer: Optional[WriteBehind] = Depends(get_write_behind),
+    limiter: RateLimiter = Depends(get_rate_limiter)
 ):
     logger.info(f"Received data: {conference}")
 
+    await enforce_rate_limit(limiter, "create_ip", client_ip(request), CREATE_IP_LIMIT)
+    await enforce_rate_limit(limiter, "create_user", str(conference.created_by), CREATE_USER_LIMIT)
+
     try:
         # Генерация уникального ID для комнаты
         room_id = str(uuid.uuid4())
@@ -29,7 +70,8 @@ async def create_conference(
         link = f"127.0.0.1/join/{hashed_room_id}"
 
         # Создание объекта конференции
-        new_conference = ConferenceResponse(
+        new_conference = make_model(
+            ConferenceResponse,
             name=conference.name,
             room_id=hashed_room_id,
             link=link,
@@ -39,15 +81,24 @@ async def create_conference(
         )
         logger.info(f"Конференция {room_id} создана")
 
-        # Сохранение данных в Supabase
-        response = supabase.table('conferences').insert({
+        row = {
             "room_id": hashed_room_id,
             "name": conference.name,
             "link": link,
             "active": True,
             "users": 1,
             "created_by": str(conference.created_by)  # Сохранение created_by
-        }).execute()
+        }
+
+        if writer is not None:
+            # Отложенная запись: строка попадает в Supabase со следующей пачкой
+            await writer.insert(row)
+            await cache.set_conference(hashed_room_id, row)
+            await cache.invalidate_lists()
+            return respond(new_conference)
+
+        # Сохранение данных в Supabase
+        response = await supabase.table('conferences').insert(row).execute()
 
         if hasattr(response, 'error') and response.error:
             raise HTTPException(
@@ -55,8 +106,13 @@ async def create_conference(
                 detail="Ошибка при создании конференции в Supabase"
             )
 
+        # Новая конференция сразу попадает в кэш, списки сбрасываются
+        if response.data:
+            await cache.set_conference(hashed_room_id, response.data[0])
+        await cache.invalidate_lists()
+
         # Возврат данных конференции
-        return new_conference
+        return respond(new_conference)
     except Exception as e:
         logger.error(f"Ошибка создания конференции: {str(e)}")
         raise HTTPException(
@@ -68,28 +124,36 @@ async def create_conference(
 @router.put("/update_conference_name", response_model=UpdateConferenceNameResponse)
 async def update_conference_name(
     update_request: UpdateConferenceNameRequest,
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache),
+    writer: Optional[WriteBehind] = Depends(get_write_behind)
 ):
     logger.info(f"Received update request: {update_request}")
 
     try:
-        # Обновление названия конференции в Supabase
-        response = supabase.table('conferences').update({
-            "name": update_request.new_name
-        }).eq('room_id', update_request.room_id).execute()
-
-        if hasattr(response, 'error') and response.error:
-            raise HTTPException(
-                status_code=500,
-                detail="Ошибка при обновлении названия конференции в Supabase"
-            )
+        if writer is not None:
+            await writer.update(update_request.room_id, {"name": update_request.new_name})
+        else:
+            # Обновление названия конференции в Supabase
+            response = await supabase.table('conferences').update({
+                "name": update_request.new_name
+            }).eq('room_id', update_request.room_id).execute()
+
+            if hasattr(response, 'error') and response.error:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Ошибка при обновлении названия конференции в Supabase"
+                )
+
+        await cache.invalidate(update_request.room_id)
 
         # Возврат обновленных данных конференции
-        return UpdateConferenceNameResponse(
+        return respond(make_model(
+            UpdateConferenceNameResponse,
             room_id=update_request.room_id,
             name=update_request.new_name,
             message="Название конференции успешно обновлено"
-        )
+        ))
     except Exception as e:
         logger.error(f"Ошибка обновления названия конференции: {str(e)}")
         raise HTTPException(
@@ -101,25 +165,33 @@ async def update_conference_name(
 @router.delete("/delete_conference", response_model=DeleteConferenceResponse)
 async def delete_conference(
     delete_request: DeleteConferenceRequest,
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache),
+    writer: Optional[WriteBehind] = Depends(get_write_behind)
 ):
     logger.info(f"Received delete request: {delete_request}")
 
     try:
-        # Удаление конференции из Supabase
-        response = supabase.table('conferences').delete().eq('room_id', delete_request.room_id).execute()
+        if writer is not None:
+            await writer.delete(delete_request.room_id)
+        else:
+            # Удаление конференции из Supabase
+            response = await supabase.table('conferences').delete().eq('room_id', delete_request.room_id).execute()
 
-        if hasattr(response, 'error') and response.error:
-            raise HTTPException(
-                status_code=500,
-                detail="Ошибка при удалении конференции из Supabase"
-            )
+            if hasattr(response, 'error') and response.error:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Ошибка при удалении конференции из Supabase"
+                )
+
+        await cache.invalidate(delete_request.room_id)
 
         # Возврат подтверждения удаления
-        return DeleteConferenceResponse(
+        return respond(make_model(
+            DeleteConferenceResponse,
             room_id=delete_request.room_id,
             message="Конференция успешно удалена"
-        )
+        ))
     except Exception as e:
         logger.error(f"Ошибка удаления конференции: {str(e)}")
         raise HTTPException(
@@ -127,37 +199,59 @@ async def delete_conference(
             detail=f"Ошибка при удалении конференции: {str(e)}"
         )
 
+# Обновление кэша строкой, которую вернуло атомарное изменение счетчика участников
+async def update_cached_conference(cache: ConferenceCache, room_id: str, conference: Optional[dict]):
+    if conference is None:
+        await cache.invalidate_conference(room_id)
+    else:
+        await cache.set_conference(room_id, conference)
+    await cache.invalidate_lists()
+
 # Присоединение пользователя к существующей конференции
 @router.get("/join_conference/{room_id}")
 async def join_conference(
     room_id: str,
-    supabase: Client = Depends(get_supabase)
+    request: Request,
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache),
+    writer: Optional[WriteBehind] = Depends(get_write_behind),
+    limiter: RateLimiter = Depends(get_rate_limiter)
     ):
     logger.info(f"attemping to join conference with room_id : {room_id}")
 
-    try:
-        # Проверка существования конференции
-        conference = supabase.table('conferences').select("*").eq("room_id", room_id).single().execute()
+    await enforce_rate_limit(limiter, "join_ip", client_ip(request), JOIN_IP_LIMIT)
+    await enforce_rate_limit(limiter, "join_room", room_id, JOIN_ROOM_LIMIT)
 
-        if not conference.data or not conference.data['active']:
+    try:
+        # Завершенная конференция не может снова стать активной, поэтому ответ берется из кэша
+        cached = await cache.get_conference(room_id)
+        if cached is not None and not cached['active']:
             raise HTTPException(
                 status_code = 404,
                 detail = "Конференция не найдена или не активна"
             )
 
-        response = supabase.table('conferences').update({
-            "users": conference.data['users'] + 1
-        }).eq("room_id", room_id).execute()
+        # Атомарное увеличение числа участников активной конференции
+        # (при отложенной записи изменение уходит в очередь, кэш обновляет очередь)
+        if writer is not None:
+            conference = await writer.adjust_users(cache, room_id, 1)
+            await cache.invalidate_lists()
+        else:
+            conference = await adjust_users(supabase, room_id, 1)
+            await update_cached_conference(cache, room_id, conference)
 
-        if hasattr(response, 'error') and response.error:
+        if conference is None:
             raise HTTPException(
-                status_code=500,
-                detail="Ошибка при обновлении данных в Supabase"
+                status_code = 404,
+                detail = "Конференция не найдена или не активна"
             )
 
         logger.info(f"User  successfully joined conference with room_id: {room_id}")
         return {"status": "Присоединение успешно"}
-    
+
+    except HTTPException:
+        raise
+
     except Exception as e:
         logger.error(f"Error joining conference: {str(e)}")
         raise HTTPException(
@@ -169,39 +263,40 @@ async def join_conference(
 @router.post("/leave_conference/{room_id}")
 async def leave_conference(
     room_id: str, 
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache),
+    writer: Optional[WriteBehind] = Depends(get_write_behind)
     ):
 
     try:
-        # Проверка существования конференции
-        conference = supabase.table('conferences').select("*").eq("room_id", room_id).single().execute()
-
-        if not conference.data or not conference.data['active']:
+        # Атомарное уменьшение числа участников; при выходе последнего
+        # участника конференция деактивируется в том же запросе
+        cached = await cache.get_conference(room_id)
+        if cached is not None and not cached['active']:
             raise HTTPException(
                 status_code=404,
                 detail="Конференция не найдена или не активна"
             )
-        
-        # Уменьшение количества пользователей в конференции
-        response = supabase.table('conferences').update({
-            "users": conference.data['users'] - 1
-        }).eq("room_id", room_id).execute()
 
-        if hasattr(response, 'error') and response.error:
+        if writer is not None:
+            conference = await writer.adjust_users(cache, room_id, -1)
+            await cache.invalidate_lists()
+        else:
+            conference = await adjust_users(supabase, room_id, -1)
+            await update_cached_conference(cache, room_id, conference)
+
+        if conference is None:
             raise HTTPException(
-                status_code=500,
-                detail="Ошибка при обновлении данных в Supabase"
+                status_code=404,
+                detail="Конференция не найдена или не активна"
             )
 
-        # Удаление конференции, если не осталось пользователей
-        if conference.data['users'] - 1 == 0:
-            supabase.table('conferences').update({
-                "active": False
-            }).eq("room_id", room_id).execute()
-
         logger.info(f"User  successfully left conference with room_id: {room_id}")
         return {"status": "Выход успешен"}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         logger.error(f"Error leaving conference: {str(e)}")
         raise HTTPException(
@@ -209,40 +304,90 @@ async def leave_conference(
             detail=f"Ошибка при выходе из конференции: {str(e)}"
         )
 
-# Получение списка активных конференций с фильтрацией по пользователю
+# Получение списка активных конференций с фильтрацией по пользователю.
+# С limit или cursor список отдается страницами: курсор следующей страницы передается
+# в заголовке X-Next-Cursor (без limit страница — DEFAULT_PAGE_SIZE строк).
+# Без limit и cursor возвращается весь список, как раньше
 @router.get("/list_conferences")
 async def list_conferences(
     created_by: str = Query(None, description="Filter by created_by"),
-    supabase: Client = Depends(get_supabase)
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size (all rows if neither limit nor cursor is given)"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+    order_by: ConferenceOrderBy = Query(ConferenceOrderBy.ROOM_ID, description="Sort column"),
+    order: SortDirection = Query(SortDirection.ASC, description="Sort direction"),
+    supabase: AsyncClient = Depends(get_supabase),
+    cache: ConferenceCache = Depends(get_cache)
 ):
+    try:
+        projection = parse_fields(fields)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Логирование значения created_by
         print(f"Filtering by created_by: {created_by}")
 
-        # Построение запроса с учетом фильтрации по created_by
-        query = supabase.table('conferences').select("*").eq("active", True)
+        desc = order == SortDirection.DESC
+        page_size = limit if limit is not None else (DEFAULT_PAGE_SIZE if cursor else None)
+        cache_key = f"{created_by or ''}|{fields or '*'}|{order_by.value}|{order.value}|{page_size or ''}|{cursor or ''}"
+        rows = await cache.get_list(cache_key)
 
-        if created_by:
-            query = query.eq("created_by", created_by)
+        if rows is None:
+            # Колонки сортировки выбираются всегда: по ним строится курсор следующей страницы
+            columns = "*" if projection is None else ",".join(sorted({*projection, order_by.value, "room_id"}))
 
-        # Логирование запроса
-        print(f"Executing query: {query}")
+            # Построение запроса с учетом фильтрации по created_by
+            query = supabase.table('conferences').select(columns).eq("active", True)
 
-        # Выполнение запроса
-        response = query.execute()
+            if created_by:
+                query = query.eq("created_by", created_by)
 
-        # Проверка наличия ошибок в ответе
-        if hasattr(response, 'error') and response.error:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Ошибка при получении данных из Supabase: {response.error.message}"
-            )
+            if after is not None:
+                query = query.or_(keyset_filter(order_by.value, after[0], after[1], desc))
+
+            query = query.order(order_by.value, desc=desc)
+            if order_by != ConferenceOrderBy.ROOM_ID:
+                query = query.order("room_id", desc=desc)
+            if page_size is not None:
+                query = query.limit(page_size)
+
+            # Логирование запроса
+            print(f"Executing query: {query}")
+
+            # Выполнение запроса
+            response = await query.execute()
+
+            # Проверка наличия ошибок в ответе
+            if hasattr(response, 'error') and response.error:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Ошибка при получении данных из Supabase: {response.error.message}"
+                )
+
+            rows = response.data
+            await cache.set_list(cache_key, rows)
+
+        headers = {}
+        if page_size is not None and len(rows) == page_size:
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1], order_by.value)
+
+        # Строки из Supabase не валидируются повторно: страница сериализуется целиком
+        if FAST_JSON:
+            return rows_response(rows, projection, headers)
 
         # Возврат данных конференций
-        return response.data
+        with tracer.span("serialize", rows=len(rows)):
+            return JSONResponse(project_rows(rows, projection), headers=headers)
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при получении списка активных конференций: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+# Статистика попаданий в кэш конференций
+@router.get("/cache_stats")
+async def cache_stats(cache: ConferenceCache = Depends(get_cache)):
+    return cache.stats.as_dict()
@@ -0,0 +1,112 @@
+import asyncio
+from contextvars import ContextVar
+import functools
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Type, TypeVar
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from conferences.src.monitoring.tracing import UNSAMPLED, current_span, tracer
+from conferences.src.repository.pagination import project_rows
+
+logger = logging.getLogger(__name__)
+
+# orjson не входит в обязательные зависимости: без него используется компактный json.dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Быстрая сериализация ответов включается FAST_JSON=1
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON=1, но orjson не установлен: используется стандартный json")
+
+Model = TypeVar("Model", bound=BaseModel)
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+# Ответ в формате JSON, сериализуемый orjson (если он установлен)
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# Ответ из готовой модели: JSON строится сериализатором pydantic-core, скомпилированным
+# при объявлении модели, без повторной валидации response_model и jsonable_encoder.
+# FastAPI не обрабатывает возвращенный Response, поэтому response_model остается только в схеме OpenAPI
+def model_response(model: BaseModel, headers: Optional[Dict[str, str]] = None) -> Response:
+    with tracer.span("serialize", model=type(model).__name__):
+        return Response(model.__pydantic_serializer__.to_json(model), media_type="application/json", headers=headers)
+
+# Модель ответа из значений, сформированных сервером: при FAST_JSON без валидации
+def make_model(model_class: Type[Model], **values: Any) -> Model:
+    with tracer.span("validate", model=model_class.__name__):
+        if FAST_JSON:
+            return model_class.model_construct(**values)
+        return model_class(**values)
+
+# Ответ маршрута с response_model: при FAST_JSON сразу JSON, иначе модель для обычной обработки FastAPI
+def respond(model: BaseModel) -> Any:
+    return model_response(model) if FAST_JSON else model
+
+# Список list_conferences одним буфером
+def rows_response(rows: List[dict], projection: Optional[List[str]], headers: Optional[Dict[str, str]] = None) -> Response:
+    with tracer.span("serialize", rows=len(rows)):
+        return Response(dumps(project_rows(rows, projection)), media_type="application/json", headers=headers)
+
+# Время возврата из обработчика маршрута и признак готового Response. Список общий
+# для задачи запроса и потока, в котором выполняется синхронный обработчик
+_endpoint_done: ContextVar[Optional[list]] = ContextVar("endpoint_done", default=None)
+
+def _mark_endpoint_done(result: Any):
+    marker = _endpoint_done.get()
+    if marker is not None:
+        marker.extend((time.time_ns(), isinstance(result, Response)))
+
+# Маршрут с отрезком serialize для обычного пути FastAPI: от возврата обработчика до готового
+# ответа (валидация response_model, jsonable_encoder и кодирование JSON).
+# Обработчики, вернувшие готовый Response, сериализуют ответ сами и отрезок пишут сами
+class TracedRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def call(**values):
+                result = await endpoint(**values)
+                _mark_endpoint_done(result)
+                return result
+        else:
+            @functools.wraps(endpoint)
+            def call(**values):
+                result = endpoint(**values)
+                _mark_endpoint_done(result)
+                return result
+        self.dependant.call = call
+
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def traced_handler(request: Request) -> Response:
+            parent = current_span()
+            if parent is None or parent is UNSAMPLED:
+                return await handler(request)
+
+            marker: list = []
+            token = _endpoint_done.set(marker)
+            try:
+                response = await handler(request)
+            finally:
+                _endpoint_done.reset(token)
+            if marker and not marker[1]:
+                tracer.record("serialize", marker[0], time.time_ns(), parent, route=path)
+            return response
+
+        return traced_handler
@@ -0,0 +1,16 @@
+# Параметры постраничного вывода списка конференций
+from enum import Enum
+
+# Поля конференции, доступные для выборки через параметр fields
+CONFERENCE_FIELDS = ("room_id", "name", "link", "active", "users", "created_by")
+
+# Колонка сортировки списка
+class ConferenceOrderBy(str, Enum):
+    ROOM_ID = "room_id"
+    NAME = "name"
+    USERS = "users"
+
+# Направление сортировки
+class SortDirection(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+import uuid
+from conferences.src.monitoring.sampled_log import RateLimitedLogger
+
+logger = logging.getLogger(__name__)
+sampled_logger = RateLimitedLogger(logger)
+
+# Обработчик сообщения, пришедшего от другого узла: (room_id, message)
+MessageHandler = Callable[[str, bytes], Awaitable[None]]
+
+# Длина идентификатора узла в заголовке сообщения (uuid4 в бинарном виде)
+NODE_ID_SIZE = 16
+
+# Шина обмена сообщениями комнат между узлами signal-сервера.
+# Каждый кадр публикуется узлом один раз; узлы, на которых есть участники комнаты,
+# получают его и раздают только своим локальным сокетам. Собственные кадры узел пропускает,
+# так как уже доставил их локально
+class Broker(ABC):
+    def __init__(self, node_id: Optional[bytes] = None):
+        self.node_id = node_id or uuid.uuid4().bytes
+        self.handlers: Dict[str, MessageHandler] = {}
+
+    @abstractmethod
+    async def publish(self, room_id: str, message: bytes):
+        ...
+
+    @abstractmethod
+    async def subscribe(self, room_id: str, handler: MessageHandler):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, room_id: str):
+        ...
+
+    async def close(self):
+        self.handlers.clear()
+
+    # Разбор конверта и передача чужого кадра обработчику комнаты
+    async def _dispatch(self, room_id: str, envelope: bytes):
+        if envelope[:NODE_ID_SIZE] == self.node_id:
+            return
+
+        handler = self.handlers.get(room_id)
+        if handler is None:
+            return
+
+        try:
+            await handler(room_id, envelope[NODE_ID_SIZE:])
+        except Exception as e:
+            sampled_logger.error("broker_dispatch_failed", room_id, room_id=room_id, error=e)
+
+# Общая шина для брокеров одного процесса
+class InMemoryBus:
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InMemoryBroker"]] = {}
+
+    async def publish(self, room_id: str, envelope: bytes):
+        for broker in list(self.subscribers.get(room_id, ())):
+            await broker._dispatch(room_id, envelope)
+
+# Брокер в памяти процесса: для одного узла и для проверки нескольких менеджеров в одном процессе
+class InMemoryBroker(Broker):
+    def __init__(self, bus: Optional[InMemoryBus] = None, node_id: Optional[bytes] = None):
+        super().__init__(node_id)
+        self.bus = bus or InMemoryBus()
+
+    async def publish(self, room_id: str, message: bytes):
+        if self.bus.subscribers.get(room_id):
+            await self.bus.publish(room_id, self.node_id + message)
+
+    async def subscribe(self, room_id: str, handler: MessageHandler):
+        self.handlers[room_id] = handler
+        self.bus.subscribers.setdefault(room_id, set()).add(self)
+
+    async def unsubscribe(self, room_id: str):
+        self.handlers.pop(room_id, None)
+        brokers = self.bus.subscribers.get(room_id)
+        if brokers is not None:
+            brokers.discard(self)
+            if not brokers:
+                del self.bus.subscribers[room_id]
+
+    async def close(self):
+        for room_id in list(self.handlers):
+            await self.unsubscribe(room_id)
+
+# Брокер поверх Redis Pub/Sub: по одному каналу на комнату.
+# Принимает готовый асинхронный клиент (например, fakeredis для локальной проверки)
+class RedisBroker(Broker):
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        client=None,
+        node_id: Optional[bytes] = None,
+        channel_prefix: str = "conference:",
+    ):
+        super().__init__(node_id)
+
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("Для RedisBroker требуется пакет redis") from e
+            client = redis.from_url(url)
+
+        self.client = client
+        self.channel_prefix = channel_prefix
+        self.pubsub = client.pubsub()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, room_id: str) -> str:
+        return f"{self.channel_prefix}{room_id}"
+
+    async def publish(self, room_id: str, message: bytes):
+        await self.client.publish(self._channel(room_id), self.node_id + message)
+
+    async def subscribe(self, room_id: str, handler: MessageHandler):
+        self.handlers[room_id] = handler
+        await self.pubsub.subscribe(self._channel(room_id))
+
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, room_id: str):
+        self.handlers.pop(room_id, None)
+        await self.pubsub.unsubscribe(self._channel(room_id))
+
+    # Чтение сообщений из подписок и передача их комнатам
+    async def _listen(self):
+        prefix_length = len(self.channel_prefix)
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+
+                await self._dispatch(channel[prefix_length:], message["data"])
+
+            except asyncio.CancelledError:
+                break
+
+            except Exception as e:
+                logger.error(f"Ошибка чтения из Redis: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+        await self.pubsub.aclose()
+        await self.client.aclose()
+        await super().close()
+
+# Создание брокера по BROKER_URL: redis://... — Redis Pub/Sub, иначе брокер в памяти
+def create_broker() -> Broker:
+    url = os.getenv("BROKER_URL")
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    return InMemoryBroker()
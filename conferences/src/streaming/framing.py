@@ -0,0 +1,93 @@
+from enum import IntEnum
+import struct
+import time
+from typing import NamedTuple, Optional, Tuple
+
+# Подпротокол WebSocket, в котором каждый кадр начинается с заголовка FRAME_HEADER.
+# Клиенты без подпротокола работают в прежнем режиме непрозрачных байтов
+FRAME_SUBPROTOCOL = "conference.v1"
+# Тот же протокол, но сервер присылает кадры пакетами: [длина uint32][кадр]...
+FRAME_BATCH_SUBPROTOCOL = "conference.v1.batch"
+FRAME_VERSION = 1
+
+# Заголовок кадра: версия, канал, id отправителя, номер кадра, время отправки (мс)
+FRAME_HEADER = struct.Struct("!BBIIQ")
+HEADER_SIZE = FRAME_HEADER.size
+
+# Идентификатор 0 зарезервирован за сервером
+SERVER_SENDER_ID = 0
+
+# Канал кадра. DATA — непрозрачные байты клиента без подпротокола: сервер оборачивает
+# их в заголовок с id отправителя, чтобы все кадры комнаты имели один формат
+class Channel(IntEnum):
+    AUDIO = 0
+    VIDEO = 1
+    CONTROL = 2
+    DATA = 3
+
+# Маска подписки на каналы: бит (1 << channel)
+ALL_CHANNELS = (1 << Channel.AUDIO) | (1 << Channel.VIDEO) | (1 << Channel.CONTROL) | (1 << Channel.DATA)
+
+# Команды в первом байте полезной нагрузки управляющего кадра
+class ControlOp(IntEnum):
+    WELCOME = 1          # сервер -> клиент: назначенный id отправителя (uint32)
+    SET_CHANNELS = 2     # клиент -> сервер: маска каналов, которые клиент хочет получать (uint8)
+    MUTE_SENDER = 3      # клиент -> сервер: не присылать кадры отправителя (uint32)
+    UNMUTE_SENDER = 4    # клиент -> сервер: снова присылать кадры отправителя (uint32)
+    PING = 5             # сервер -> клиент: проверка соединения
+    PONG = 6             # клиент -> сервер: ответ на PING (подойдет и любой другой кадр)
+    REDIRECT = 7         # сервер -> клиент: комната переехала, адрес WebSocket (UTF-8)
+
+class FrameHeader(NamedTuple):
+    channel: Channel
+    sender_id: int
+    sequence: int
+    timestamp: int
+
+# Разбор заголовка без копирования кадра. None, если кадр не соответствует протоколу
+def parse_header(data: bytes) -> Optional[FrameHeader]:
+    if len(data) < HEADER_SIZE:
+        return None
+
+    version, channel, sender_id, sequence, timestamp = FRAME_HEADER.unpack_from(memoryview(data))
+    if version != FRAME_VERSION or channel > Channel.DATA:
+        return None
+    return FrameHeader(Channel(channel), sender_id, sequence, timestamp)
+
+# Разбор команды управляющего кадра, адресованной серверу: (команда, аргумент)
+def parse_control(data: bytes) -> Optional[Tuple[ControlOp, int]]:
+    payload = memoryview(data)[HEADER_SIZE:]
+    if not payload:
+        return None
+
+    op = payload[0]
+    if op == ControlOp.PONG:
+        return ControlOp.PONG, 0
+    if op == ControlOp.SET_CHANNELS and len(payload) >= 2:
+        return ControlOp.SET_CHANNELS, payload[1]
+    if op in (ControlOp.MUTE_SENDER, ControlOp.UNMUTE_SENDER) and len(payload) >= 5:
+        return ControlOp(op), int.from_bytes(payload[1:5], "big")
+    return None
+
+def encode_frame(channel: Channel, sender_id: int, sequence: int, payload: bytes) -> bytes:
+    header = FRAME_HEADER.pack(FRAME_VERSION, channel, sender_id, sequence, int(time.time() * 1000))
+    return header + payload
+
+# Управляющий кадр с id, назначенным клиенту при подключении
+def encode_welcome(sender_id: int) -> bytes:
+    return encode_frame(
+        Channel.CONTROL,
+        SERVER_SENDER_ID,
+        0,
+        bytes([ControlOp.WELCOME]) + sender_id.to_bytes(4, "big")
+    )
+
+def encode_ping() -> bytes:
+    return encode_frame(Channel.CONTROL, SERVER_SENDER_ID, 0, bytes([ControlOp.PING]))
+
+# Управляющий кадр с новым адресом комнаты после перестройки кольца узлов
+def encode_redirect(url: str) -> bytes:
+    return encode_frame(Channel.CONTROL, SERVER_SENDER_ID, 0, bytes([ControlOp.REDIRECT]) + url.encode())
+
+def encode_pong(sender_id: int) -> bytes:
+    return encode_frame(Channel.CONTROL, sender_id, 0, bytes([ControlOp.PONG]))
@@ -0,0 +1,166 @@
+import asyncio
+from bisect import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+# Кольцо консистентного хеширования: каждый узел занимает vnodes точек на кольце,
+# комната принадлежит первому узлу по часовой стрелке от хеша room_id.
+# При добавлении или удалении узла переезжают только комнаты его участков (~1/N)
+class HashRing:
+    def __init__(self, vnodes: int = 128):
+        self.vnodes = vnodes
+        self.nodes: Dict[str, str] = {}
+        self._points: List[int] = []
+        self._owners: List[str] = []
+
+    def set_nodes(self, nodes: Dict[str, str]):
+        ring = sorted(
+            (_hash(f"{node_id}#{index}"), node_id)
+            for node_id in nodes
+            for index in range(self.vnodes)
+        )
+        self.nodes = dict(nodes)
+        self._points = [point for point, _ in ring]
+        self._owners = [node_id for _, node_id in ring]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+# Узлы из SIGNAL_NODES: "node-a=wss://a.example.com,node-b=wss://b.example.com"
+def parse_nodes(value: Optional[str]) -> Dict[str, str]:
+    nodes = {}
+    for item in (value or "").split(","):
+        node_id, _, url = item.strip().partition("=")
+        if node_id and url:
+            nodes[node_id.strip()] = url.strip().rstrip("/")
+    return nodes
+
+# Размещение комнат по узлам signal-сервера.
+# Состав узлов задается списком SIGNAL_NODES и/или реестром в Redis (SIGNAL_REGISTRY_URL),
+# где каждый узел периодически продлевает свою запись. При изменении состава кольцо
+# перестраивается и вызывается on_change, чтобы узел отдал комнаты, которые ему больше не принадлежат
+class Placement:
+    def __init__(
+        self,
+        node_id: str,
+        node_url: Optional[str] = None,
+        static_nodes: Optional[Dict[str, str]] = None,
+        registry_url: Optional[str] = None,
+        client=None,
+        vnodes: int = 128,
+        interval: float = 5.0,
+        ttl: float = 15.0,
+        key: str = "signal_nodes",
+    ):
+        self.node_id = node_id
+        self.node_url = node_url.rstrip("/") if node_url else None
+        self.static_nodes = dict(static_nodes or {})
+        self.ring = HashRing(vnodes)
+        self.interval = interval
+        self.ttl = ttl
+        self.key = key
+        self.client = client
+        self.on_change: Optional[Callable[[], None]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        if client is None and registry_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("Для реестра узлов требуется пакет redis") from e
+            self.client = redis.from_url(registry_url)
+
+        if self.node_url:
+            self.static_nodes.setdefault(node_id, self.node_url)
+        self.ring.set_nodes(self.static_nodes)
+
+    # Размещение включено, если этот узел есть на кольце и известен хотя бы один другой
+    @property
+    def enabled(self) -> bool:
+        return self.node_id in self.ring.nodes and len(self.ring.nodes) > 1
+
+    # Узел и адрес WebSocket комнаты; None, если размещение не настроено
+    def owner(self, room_id: str) -> Optional[Tuple[str, str]]:
+        node_id = self.ring.node_for(room_id)
+        if node_id is None:
+            return None
+        return node_id, f"{self.ring.nodes[node_id]}/ws/{room_id}"
+
+    def is_local(self, room_id: str) -> bool:
+        return not self.enabled or self.ring.node_for(room_id) == self.node_id
+
+    async def start(self, on_change: Optional[Callable[[], None]] = None):
+        self.on_change = on_change
+        if self.client is None:
+            return
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logger.error(f"Ошибка реестра узлов: {e}")
+
+    # Продление своей записи и чтение живых узлов. Запись хранится в sorted set
+    # со временем истечения в качестве score
+    async def _heartbeat(self):
+        now = time.time()
+        if self.node_url:
+            await self.client.zadd(self.key, {f"{self.node_id}={self.node_url}": now + self.ttl})
+        await self.client.zremrangebyscore(self.key, "-inf", now)
+        members = await self.client.zrangebyscore(self.key, now, "+inf")
+
+        nodes = dict(self.static_nodes)
+        for member in members:
+            node_id, _, url = (member.decode() if isinstance(member, bytes) else member).partition("=")
+            nodes[node_id] = url
+        self._update(nodes)
+
+    def _update(self, nodes: Dict[str, str]):
+        if nodes == self.ring.nodes:
+            return
+
+        logger.info(f"Состав узлов signal-сервера: {', '.join(sorted(nodes))}")
+        self.ring.set_nodes(nodes)
+        if self.on_change is not None:
+            self.on_change()
+
+    # Удаление своей записи: остальные узлы забирают комнаты, не дожидаясь истечения записи
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self.client is not None:
+            try:
+                if self.node_url:
+                    await self.client.zrem(self.key, f"{self.node_id}={self.node_url}")
+            except Exception as e:
+                logger.error(f"Ошибка удаления узла из реестра: {e}")
+            await self.client.aclose()
+
+def create_placement() -> Placement:
+    return Placement(
+        node_id=os.getenv("SIGNAL_NODE_ID") or socket.gethostname(),
+        node_url=os.getenv("SIGNAL_NODE_URL"),
+        static_nodes=parse_nodes(os.getenv("SIGNAL_NODES")),
+        registry_url=os.getenv("SIGNAL_REGISTRY_URL"),
+        vnodes=int(os.getenv("SIGNAL_RING_VNODES", "128")),
+        interval=float(os.getenv("SIGNAL_REGISTRY_INTERVAL", "5")),
+        ttl=float(os.getenv("SIGNAL_REGISTRY_TTL", "15")),
+    )
@@ -0,0 +1,362 @@
+import asyncio
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+import glob
+import heapq
+import logging
+import mmap
+import os
+import queue
+import re
+import socket
+import struct
+import threading
+import time
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from conferences.src.streaming.framing import Channel
+
+logger = logging.getLogger(__name__)
+
+# Запись кадра в сегменте: время (мс), id отправителя, канал (NO_CHANNEL — кадр без заголовка), длина
+RECORD_HEADER = struct.Struct("!QIBI")
+# Запись индекса: время первого кадра (мс) и его смещение в сегменте
+INDEX_ENTRY = struct.Struct("!QQ")
+NO_CHANNEL = 255
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+# room_id становится именем каталога, поэтому допускаются только безопасные символы
+ROOM_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+def valid_room_id(room_id: str) -> bool:
+    return ROOM_ID_PATTERN.fullmatch(room_id) is not None
+
+# Имя сегмента: <время начала>-<узел>-<pid>.seg. Каждый процесс пишет в комнату
+# только кадры своих участников, поэтому у каждого свои файлы
+def segment_name(start: int, writer_id: str) -> str:
+    return f"{start:016d}-{writer_id}"
+
+# Время начала и процесс-автор сегмента по имени файла без суффикса
+def parse_segment_name(name: str) -> Tuple[int, str]:
+    start, _, writer_id = name.partition("-")
+    return int(start), writer_id
+
+class RecordedFrame(NamedTuple):
+    timestamp: int
+    sender_id: int
+    channel: Optional[Channel]
+    payload: bytes
+
+# Счетчики записи
+@dataclass
+class RecorderStats:
+    written_frames: int = 0
+    written_bytes: int = 0
+    dropped_frames: int = 0
+    segments: int = 0
+    write_errors: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+# Сегмент записи комнаты: файл кадров и разреженный индекс (запись раз в index_interval мс)
+class SegmentWriter:
+    def __init__(self, directory: str, start: int, writer_id: str, index_interval: int):
+        name = os.path.join(directory, segment_name(start, writer_id))
+        self.path = name + SEGMENT_SUFFIX
+        self.data: BinaryIO = open(self.path, "ab")
+        self.index: BinaryIO = open(name + INDEX_SUFFIX, "ab")
+        self.size = self.data.tell()
+        self.start = start
+        self.index_interval = index_interval
+        self.indexed_at: Optional[int] = None
+
+    def append(self, timestamp: int, sender_id: int, channel: int, payload: bytes):
+        if self.indexed_at is None or timestamp - self.indexed_at >= self.index_interval:
+            self.index.write(INDEX_ENTRY.pack(timestamp, self.size))
+            self.indexed_at = timestamp
+
+        self.data.write(RECORD_HEADER.pack(timestamp, sender_id, channel, len(payload)))
+        self.data.write(payload)
+        self.size += RECORD_HEADER.size + len(payload)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+# Запись потоков комнат в сегментные файлы <dir>/<room_id>/<время начала>-<узел>-<pid>.seg + .idx.
+# Записываются только кадры, пришедшие от участников этого процесса: кадры других воркеров
+# и узлов записывают они сами, и воспроизведение сливает сегменты всех процессов по времени.
+# record() только кладет кадр в ограниченную очередь, файлы пишет отдельный поток,
+# поэтому запись не задерживает рассылку; при переполнении очереди кадры отбрасываются.
+# Список записываемых комнат хранится в Redis (state_url), если он задан: каждый процесс
+# перечитывает его раз в interval секунд. Без Redis список свой у каждого процесса
+class Recorder:
+    def __init__(
+        self,
+        directory: str,
+        writer_id: Optional[str] = None,
+        record_all: bool = False,
+        max_queue: int = 10000,
+        segment_bytes: int = 64 * 1024 * 1024,
+        index_interval: int = 1000,
+        state_url: Optional[str] = None,
+        client=None,
+        interval: float = 1.0,
+        key: str = "recording_rooms",
+    ):
+        self.directory = directory
+        self.writer_id = UNSAFE_NAME_CHARS.sub("_", writer_id or socket.gethostname()) + f"-{os.getpid()}"
+        self.record_all = record_all
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.interval = interval
+        self.key = key
+        self.client = client
+        self.stats = RecorderStats()
+        self.active: Set[str] = set()
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+        if client is None and state_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("Для общего состояния записи требуется пакет redis") from e
+            self.client = redis.from_url(state_url)
+
+    def recording(self, room_id: str) -> bool:
+        return room_id in self.active or (self.record_all and valid_room_id(room_id))
+
+    # Чтение общего списка комнат и периодическое обновление
+    async def start(self):
+        if self.client is None:
+            return
+        await self._sync()
+        self._task = asyncio.create_task(self._run_sync())
+
+    async def _run_sync(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.error(f"Ошибка чтения состояния записи: {e}")
+
+    async def _sync(self):
+        members = await self.client.smembers(self.key)
+        self._update({member.decode() if isinstance(member, bytes) else member for member in members})
+
+    # Комнаты, запись которых выключил другой процесс, закрывают свои сегменты
+    def _update(self, rooms: Set[str]):
+        for room_id in self.active - rooms:
+            self._put(("close", room_id))
+        self.active = rooms
+
+    async def start_room(self, room_id: str):
+        if not valid_room_id(room_id):
+            raise ValueError("Недопустимый room_id")
+        if self.client is not None:
+            await self.client.sadd(self.key, room_id)
+        self.active.add(room_id)
+
+    async def stop_room(self, room_id: str):
+        if self.client is not None:
+            await self.client.srem(self.key, room_id)
+        self.active.discard(room_id)
+        self._put(("close", room_id))
+
+    # Комната закрыта на узле: файлы закрываются, новые кадры начнут новый сегмент
+    def release(self, room_id: str):
+        if self.recording(room_id):
+            self._put(("close", room_id))
+
+    def record(self, room_id: str, message: bytes, sender_id: int, channel: Optional[Channel]):
+        if not self.recording(room_id):
+            return
+
+        timestamp = int(time.time() * 1000)
+        if not self._put(("frame", room_id, timestamp, sender_id, NO_CHANNEL if channel is None else channel, message)):
+            self.stats.dropped_frames += 1
+
+    def _put(self, item: tuple) -> bool:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self._thread.start()
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        writers: Dict[str, SegmentWriter] = {}
+        while True:
+            item = self._queue.get()
+            try:
+                while True:
+                    if item[0] == "stop":
+                        for writer in writers.values():
+                            writer.close()
+                        return
+                    self._handle(writers, item)
+                    # Очередь пуста: данные сбрасываются на диск, чтобы их видело воспроизведение
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                for writer in writers.values():
+                    writer.flush()
+            except Exception as e:
+                self.stats.write_errors += 1
+                logger.error(f"Ошибка записи конференции: {e}")
+
+    def _handle(self, writers: Dict[str, SegmentWriter], item: tuple):
+        room_id = item[1]
+        if item[0] == "close":
+            writer = writers.pop(room_id, None)
+            if writer is not None:
+                writer.close()
+            return
+
+        _, _, timestamp, sender_id, channel, message = item
+        writer = writers.get(room_id)
+        if writer is not None and writer.size >= self.segment_bytes:
+            writer.close()
+            writer = None
+        if writer is None:
+            directory = os.path.join(self.directory, room_id)
+            os.makedirs(directory, exist_ok=True)
+            writer = SegmentWriter(directory, timestamp, self.writer_id, self.index_interval)
+            writers[room_id] = writer
+            self.stats.segments += 1
+
+        writer.append(timestamp, sender_id, channel, message)
+        self.stats.written_frames += 1
+        self.stats.written_bytes += len(message)
+
+    # Остановка синхронизации и потока записи после сброса очереди
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+        await asyncio.to_thread(self._stop_thread)
+
+    def _stop_thread(self):
+        if self._thread is None:
+            return
+        self._queue.put(("stop",))
+        self._thread.join()
+        self._thread = None
+
+# Чтение записи комнаты через mmap: сегмент выбирается по времени начала,
+# позиция внутри сегмента — двоичным поиском по индексу.
+# Сегменты разных процессов читаются параллельно и сливаются по времени кадра
+class RecordingReader:
+    def __init__(self, directory: str, room_id: str):
+        if not valid_room_id(room_id):
+            raise ValueError("Недопустимый room_id")
+        self.path = os.path.join(directory, room_id)
+
+    # (время начала, процесс-автор, путь), по времени начала
+    def segments(self) -> List[Tuple[int, str, str]]:
+        paths = glob.glob(os.path.join(self.path, f"*{SEGMENT_SUFFIX}"))
+        return sorted(
+            (*parse_segment_name(os.path.basename(path)[:-len(SEGMENT_SUFFIX)]), path)
+            for path in paths
+        )
+
+    # Кадры с временем в [start, end)
+    def frames(self, start: int = 0, end: Optional[int] = None) -> Iterator[RecordedFrame]:
+        writers: Dict[str, List[Tuple[int, str]]] = {}
+        for segment_start, writer_id, path in self.segments():
+            writers.setdefault(writer_id, []).append((segment_start, path))
+
+        streams = [self._writer_frames(segments, start, end) for segments in writers.values()]
+        if len(streams) == 1:
+            yield from streams[0]
+        else:
+            yield from heapq.merge(*streams, key=lambda frame: frame.timestamp)
+
+    # Кадры сегментов одного процесса: они идут подряд и не пересекаются по времени
+    def _writer_frames(self, segments: List[Tuple[int, str]], start: int, end: Optional[int]) -> Iterator[RecordedFrame]:
+        starts = [segment_start for segment_start, _ in segments]
+        # Первый сегмент, который может содержать start: последний, начатый не позже start
+        first = max(bisect_right(starts, start) - 1, 0)
+        for segment_start, path in segments[first:]:
+            if end is not None and segment_start >= end:
+                return
+            yield from self._read_segment(path, start, end)
+
+    def _read_segment(self, path: str, start: int, end: Optional[int]) -> Iterator[RecordedFrame]:
+        with open(path, "rb") as data:
+            size = os.fstat(data.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(data.fileno(), size, access=mmap.ACCESS_READ) as view:
+                offset = self._seek(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, start)
+                while offset + RECORD_HEADER.size <= size:
+                    timestamp, sender_id, channel, length = RECORD_HEADER.unpack_from(view, offset)
+                    payload_start = offset + RECORD_HEADER.size
+                    # Последний кадр мог быть дописан не полностью
+                    if payload_start + length > size:
+                        return
+                    if end is not None and timestamp >= end:
+                        return
+                    if timestamp >= start:
+                        yield RecordedFrame(
+                            timestamp,
+                            sender_id,
+                            None if channel == NO_CHANNEL else Channel(channel),
+                            view[payload_start:payload_start + length]
+                        )
+                    offset = payload_start + length
+
+    # Смещение последней записи индекса со временем не позже start
+    def _seek(self, index_path: str, start: int) -> int:
+        try:
+            with open(index_path, "rb") as index:
+                entries = index.read()
+        except FileNotFoundError:
+            return 0
+
+        count = len(entries) // INDEX_ENTRY.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if INDEX_ENTRY.unpack_from(entries, middle * INDEX_ENTRY.size)[0] <= start:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return 0
+        return INDEX_ENTRY.unpack_from(entries, (low - 1) * INDEX_ENTRY.size)[1]
+
+# Запись включается RECORDING_DIR; RECORDING_ALL=1 записывает все комнаты,
+# иначе только запущенные через POST /recordings/{room_id}/start.
+# RECORDING_STATE_URL (redis://) делает список записываемых комнат общим для воркеров и узлов
+def create_recorder(node_id: Optional[str] = None) -> Optional[Recorder]:
+    directory = os.getenv("RECORDING_DIR")
+    if not directory:
+        return None
+
+    return Recorder(
+        directory,
+        writer_id=node_id,
+        record_all=os.getenv("RECORDING_ALL", "0") == "1",
+        max_queue=int(os.getenv("RECORDING_MAX_QUEUE", "10000")),
+        segment_bytes=int(os.getenv("RECORDING_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+        index_interval=int(os.getenv("RECORDING_INDEX_INTERVAL_MS", "1000")),
+        state_url=os.getenv("RECORDING_STATE_URL"),
+        interval=float(os.getenv("RECORDING_STATE_INTERVAL", "1")),
+    )
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from fastapi import WebSocket
+from conferences.src.admission.rate_limiter import Limit, TokenBucket
+from conferences.src.streaming.subscriber import RoomStats, Subscriber
+
+# Комната signal-сервера на этом узле.
+# Счетчик ссылок учитывает подписчиков и подключения, которые еще не завершили вход:
+# комната удаляется, только когда ее не держит никто.
+# ingress — общая корзина входящих кадров всех участников комнаты,
+# subscription — подписка узла на комнату в брокере, общая для всех входящих клиентов
+class Room:
+    __slots__ = ("room_id", "subscribers", "stats", "refs", "last_activity", "ingress", "subscription")
+
+    def __init__(self, room_id: str, frame_limit: Optional[Limit] = None):
+        self.room_id = room_id
+        self.subscribers: Dict[WebSocket, Subscriber] = {}
+        self.stats = RoomStats()
+        self.refs = 0
+        self.last_activity = time.monotonic()
+        self.ingress = TokenBucket(frame_limit.burst, self.last_activity) if frame_limit is not None else None
+        self.subscription: Optional[asyncio.Task] = None
+
+    def acquire(self):
+        self.refs += 1
+
+    # Возвращает True, если ссылок не осталось и комнату нужно удалить
+    def release(self) -> bool:
+        self.refs -= 1
+        return self.refs <= 0
+
+    def touch(self):
+        self.last_activity = time.monotonic()
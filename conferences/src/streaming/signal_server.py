@@ -1,74 +1,472 @@
 import asyncio
-from collections import defaultdict
 import logging
-from typing import Dict, List
+import math
+import os
+import secrets
+import time
+from typing import Dict, Optional
 from fastapi import WebSocket
+from fastapi.responses import JSONResponse
+from conferences.src.admission.rate_limiter import InMemoryRateLimiter, RateLimiter, limit_from_env
+from conferences.src.monitoring.metrics import PrometheusWriter
+from conferences.src.monitoring.sampled_log import RateLimitedLogger
+from conferences.src.streaming.broker import Broker, InMemoryBroker
+from conferences.src.streaming.framing import (
+    FRAME_BATCH_SUBPROTOCOL, FRAME_SUBPROTOCOL, HEADER_SIZE, SERVER_SENDER_ID, Channel, ControlOp,
+    encode_frame, encode_ping, encode_redirect, encode_welcome, parse_control, parse_header,
+)
+from conferences.src.streaming.placement import Placement
+from conferences.src.streaming.recorder import Recorder
+from conferences.src.streaming.room import Room
+from conferences.src.streaming.subscriber import BatchConfig, OverflowPolicy, Subscriber, create_batch_config
 
 logger = logging.getLogger(__name__)
+sampled_logger = RateLimitedLogger(logger)
 
-# Управление очередями сообщений для каждой комнаты
-# Это позволяет буферизировать сообщения и обрабатывать их асинхронно
-# Обработка бинарных потоков и передача их через очередь сообщений
+# Код закрытия сокетов мертвых соединений и простаивающих комнат (going away)
+GOING_AWAY_CLOSE_CODE = 1001
+# Код закрытия при остановке процесса: клиент переподключается к другому воркеру (service restart)
+SERVICE_RESTART_CLOSE_CODE = 1012
+# Код закрытия клиента, который продолжает присылать кадры сверх лимита (policy violation)
+RATE_LIMITED_CLOSE_CODE = 1008
+# Код отказа в подключении, если сервер не поддерживает HTTP-ответ на рукопожатие (try again later)
+TRY_AGAIN_LATER_CLOSE_CODE = 1013
+
+# Управление подписчиками каждой комнаты
+# У каждого сокета собственный ограниченный буфер и задача отправки,
+# поэтому медленный клиент не задерживает трансляцию для остальных участников.
+# Кадры публикуются в брокер, чтобы участники комнаты на других узлах тоже их получали.
+# Клиентам с подпротоколом conference.v1 пересылаются только кадры подписанных каналов,
+# отправитель свой кадр обратно не получает. Байты клиентов без подпротокола сервер
+# оборачивает в кадр канала DATA, поэтому в рассылку и брокер попадают только кадры с заголовком.
+# Фоновая задача рассылает PING, закрывает мертвые сокеты и простаивающие комнаты.
+# Подключения ограничены по частоте с одного IP и по числу участников комнаты,
+# входящие кадры — корзинами токенов соединения и комнаты.
+# Если настроено размещение комнат по узлам, подключения к чужим комнатам перенаправляются.
+# Если включена запись, рассылаемые кадры передаются записи комнаты
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = defaultdict(list)
-        self.message_queues: Dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
-        self.tasks: Dict[str, asyncio.Task] = {}
-
-    async def connect(self, websocket: WebSocket, room_id: str):
-        await websocket.accept()
-        self.active_connections[room_id].append(websocket)
+    def __init__(
+        self,
+        broker: Optional[Broker] = None,
+        max_queue_size: Optional[int] = None,
+        overflow_policy: Optional[OverflowPolicy] = None,
+        max_drops: Optional[int] = None,
+        batching: Optional[BatchConfig] = None,
+        heartbeat_interval: Optional[float] = None,
+        heartbeat_timeout: Optional[float] = None,
+        room_idle_timeout: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        room_capacity: Optional[int] = None,
+        placement: Optional[Placement] = None,
+        recorder: Optional[Recorder] = None,
+    ):
+        self.broker = broker or InMemoryBroker()
+        self.max_queue_size = max_queue_size or int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.overflow_policy = overflow_policy or OverflowPolicy(os.getenv("WS_OVERFLOW_POLICY", OverflowPolicy.DROP_OLDEST.value))
+        self.max_drops = max_drops or int(os.getenv("WS_MAX_DROPS", "100"))
+        self.batching = batching or create_batch_config()
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv("WS_HEARTBEAT_INTERVAL", "15"))
+        self.heartbeat_timeout = heartbeat_timeout or float(os.getenv("WS_HEARTBEAT_TIMEOUT", "45"))
+        # 0 отключает закрытие простаивающих комнат
+        self.room_idle_timeout = room_idle_timeout if room_idle_timeout is not None else float(os.getenv("WS_ROOM_IDLE_TIMEOUT", "1800"))
+        self.rate_limiter = rate_limiter or InMemoryRateLimiter()
+        # 0 снимает ограничение числа участников комнаты на узле
+        self.room_capacity = room_capacity if room_capacity is not None else int(os.getenv("WS_ROOM_CAPACITY", "200"))
+        self.connect_limit = limit_from_env("WS_CONNECT_IP_LIMIT", "60/m")
+        self.frame_limit = limit_from_env("WS_FRAMES_LIMIT", "500/s")
+        self.byte_limit = limit_from_env("WS_BYTES_LIMIT", "4000000/s")
+        self.room_frame_limit = limit_from_env("WS_ROOM_FRAMES_LIMIT", "5000/s")
+        self.max_rejected_frames = int(os.getenv("WS_MAX_REJECTED_FRAMES", "200"))
+        self.placement = placement
+        self.enforce_placement = os.getenv("SIGNAL_ENFORCE_PLACEMENT", "1") == "1"
+        self.redirect_grace = float(os.getenv("SIGNAL_REDIRECT_GRACE", "1"))
+        self.recorder = recorder
+        self.rooms: Dict[str, Room] = {}
+        self.moved_rooms = 0
+        self.reaped_rooms = 0
+        self.dead_connections = 0
+        self.rejected_connections: Dict[str, int] = {}
+        self.draining = False
+        self._maintenance: Optional[asyncio.Task] = None
+
+    # Возвращает False, если подключение отклонено или процесс останавливается
+    async def connect(self, websocket: WebSocket, room_id: str) -> bool:
+        client_ip = websocket.client.host if websocket.client else "unknown"
+        retry_after = await self.rate_limiter.acquire("ws_connect_ip", client_ip, self.connect_limit)
+        if retry_after > 0:
+            await self._reject(
+                websocket, "rate_limited", 429, {"detail": "Слишком много подключений"},
+                {"Retry-After": str(math.ceil(retry_after))}
+            )
+            return False
+
+        # Комната другого узла: клиент получает адрес узла и подключается заново
+        if self.placement is not None and self.enforce_placement and not self.placement.is_local(room_id):
+            node_id, url = self.placement.owner(room_id)
+            await self._reject(
+                websocket, "misplaced", 307, {"detail": "Комната обслуживается другим узлом", "node_id": node_id, "url": url},
+                {"Location": url}, SERVICE_RESTART_CLOSE_CODE
+            )
+            return False
+
+        # Пакетная доставка доступна клиентам, запросившим conference.v1.batch, если она включена на сервере
+        subprotocols = websocket.scope.get("subprotocols", [])
+        subprotocol = None
+        if self.batching is not None and FRAME_BATCH_SUBPROTOCOL in subprotocols:
+            subprotocol = FRAME_BATCH_SUBPROTOCOL
+        elif FRAME_SUBPROTOCOL in subprotocols:
+            subprotocol = FRAME_SUBPROTOCOL
+
+        if self.draining:
+            await websocket.accept(subprotocol=subprotocol)
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+            return False
+
+        if self._maintenance is None:
+            self._maintenance = asyncio.create_task(self._maintain())
+
+        # Место в комнате занимается до рукопожатия: ссылки учитывают и еще не вошедших клиентов
+        room = self.rooms.get(room_id)
+        if room is not None and self.room_capacity and room.refs >= self.room_capacity:
+            await self._reject(websocket, "room_full", 429, {"detail": "Комната заполнена"})
+            return False
+
+        if room is None:
+            room = Room(room_id, self.room_frame_limit)
+            self.rooms[room_id] = room
+            logger.info(f"Комната {room_id} создана")
+
+        # Ссылка удерживает комнату, пока идет рукопожатие и подписка; затем ее наследует подписчик.
+        # Подписка запускается до первого await, поэтому одновременные первые клиенты ждут одну и ту же
+        room.acquire()
+        subscription = self._subscription(room)
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+            await asyncio.shield(subscription)
+        except Exception:
+            self._release(room)
+            raise
+
+        subscriber = Subscriber(
+            websocket,
+            room_id,
+            room.stats,
+            self.max_queue_size,
+            self.overflow_policy,
+            self.max_drops,
+            self._on_subscriber_closed,
+            sender_id=self._new_sender_id(room),
+            framed=subprotocol is not None,
+            batching=self.batching if subprotocol == FRAME_BATCH_SUBPROTOCOL else None,
+            frame_limit=self.frame_limit,
+            byte_limit=self.byte_limit,
+        )
+        room.subscribers[websocket] = subscriber
         logger.info(f"Клиент подключился к комнате {room_id}")
 
-        if room_id not in self.tasks:
-            self.tasks[room_id] = asyncio.create_task(self.send_messages(room_id))
-            logger.info(f"Задача для комнаты {room_id} создана")
-    
-    def disconnect(self, websocket: WebSocket, room_id: str):
-        if websocket in self.active_connections[room_id]:
-            self.active_connections[room_id].remove(websocket)
-            logger.info(f"Клиент отключен от комнаты {room_id}")
-
-        if not self.active_connections[room_id] and room_id in self.tasks:
-            self.tasks[room_id].cancel()
-            del self.tasks[room_id]
-            logger.info(f"Задача для комнаты {room_id} остановлена")
-
-    # Асинхронный метод доставки сообщения в очередь, а не отправка их непосредственно
-    async def broadcast(self, room_id: str, message: bytes):
-        # Проверка на количество участников
-        if len(self.active_connections[room_id]) > 1:
-            await self.message_queues[room_id].put(message)
-            logger.debug(f"Сообщение добавлено в очередь комнаты {room_id}")
+        # Клиент узнает свой id и подписывает им кадры
+        if subscriber.framed:
+            subscriber.enqueue(encode_welcome(subscriber.sender_id))
+        return True
+
+    # Подписка узла на комнату в брокере; неудавшаяся подписка повторяется следующим клиентом
+    def _subscription(self, room: Room) -> asyncio.Task:
+        task = room.subscription
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = asyncio.create_task(self.broker.subscribe(room.room_id, self._deliver_local))
+            room.subscription = task
+        return task
+
+    # Отказ в подключении: HTTP-ответ на рукопожатие, если сервер это поддерживает,
+    # иначе подключение принимается и сразу закрывается кодом close_code
+    async def _reject(
+        self,
+        websocket: WebSocket,
+        reason: str,
+        status_code: int,
+        content: dict,
+        headers: Optional[Dict[str, str]] = None,
+        close_code: int = TRY_AGAIN_LATER_CLOSE_CODE,
+    ):
+        self.rejected_connections[reason] = self.rejected_connections.get(reason, 0) + 1
+        sampled_logger.warning("connection_rejected", reason, reason=reason, client=websocket.client)
+
+        if "websocket.http.response" in websocket.scope.get("extensions", {}):
+            await websocket.send_denial_response(JSONResponse(content, status_code=status_code, headers=headers))
         else:
-            logger.info(f"В комнате {room_id} только один участник. Сообщение не отправлено.")
-            
-    # Асинхронный метод запускается как отдельная задача для каждой комнаты и обрабатывает отправку сообщений с задержкой
-    async def send_messages(self, room_id: str):
+            await websocket.accept()
+            await websocket.close(code=close_code, reason=reason)
+
+    # Случайный id отправителя: уникален в комнате и с высокой вероятностью между узлами
+    def _new_sender_id(self, room: Room) -> int:
+        used = {subscriber.sender_id for subscriber in room.subscribers.values()}
         while True:
-            try:
-                message = await self.message_queues[room_id].get()
-                connections = self.active_connections[room_id].copy()
+            sender_id = secrets.randbits(32)
+            if sender_id != SERVER_SENDER_ID and sender_id not in used:
+                return sender_id
+
+    def disconnect(self, websocket: WebSocket, room_id: str):
+        room = self.rooms.get(room_id)
+        subscriber = room.subscribers.get(websocket) if room is not None else None
+        if subscriber is not None:
+            # close() вызывает _on_subscriber_closed, который удаляет подписчика из комнаты
+            subscriber.close()
+
+    def _on_subscriber_closed(self, subscriber: Subscriber):
+        room = self.rooms.get(subscriber.room_id)
+        if room is None or room.subscribers.pop(subscriber.websocket, None) is None:
+            return
+
+        logger.info(f"Клиент отключен от комнаты {room.room_id}")
+        self._release(room)
 
-                logger.info(f"Началась трансляция сообщения в комнату {room_id}")
-                
-                # Вызов _safe_send
-                await asyncio.gather(
-                    *[self._safe_send(connection, message, room_id) for connection in connections],
-                    return_exceptions=True
-                )
+    # Удаление комнаты, когда ее больше никто не держит
+    def _release(self, room: Room):
+        if not room.release() or self.rooms.get(room.room_id) is not room:
+            return
 
-            except asyncio.CancelledError:
-                logger.info(f"Задача для комнаты {room_id} отменена")
-                break
+        del self.rooms[room.room_id]
+        logger.info(f"Комната {room.room_id} закрыта")
+        if self.recorder is not None:
+            self.recorder.release(room.room_id)
+        asyncio.create_task(self._unsubscribe(room.room_id))
 
+    # Отписка узла от комнаты, если за время ожидания в нее никто не вернулся
+    async def _unsubscribe(self, room_id: str):
+        if room_id in self.rooms:
+            return
+
+        try:
+            await self.broker.unsubscribe(room_id)
+        except Exception as e:
+            logger.error(f"Ошибка отписки от комнаты {room_id}: {e}")
+
+    # Периодическая проверка соединений и комнат
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self._sweep(time.monotonic())
             except Exception as e:
-                logger.error(f"Ошибка в send_messages: {e}")
-    
-    async def _safe_send(self, websocket: WebSocket, message: bytes, room_id: str):
+                logger.error(f"Ошибка обслуживания комнат: {e}")
+
+    def _sweep(self, now: float):
+        ping = encode_ping()
+        for room in list(self.rooms.values()):
+            if self.room_idle_timeout and now - room.last_activity > self.room_idle_timeout:
+                logger.info(f"Комната {room.room_id} закрыта по простою")
+                self.reaped_rooms += 1
+                for subscriber in list(room.subscribers.values()):
+                    subscriber.close(GOING_AWAY_CLOSE_CODE)
+                continue
+
+            for subscriber in list(room.subscribers.values()):
+                if subscriber.is_dead(now, self.heartbeat_timeout):
+                    self.dead_connections += 1
+                    subscriber.close(GOING_AWAY_CLOSE_CODE)
+                elif subscriber.framed:
+                    subscriber.enqueue(ping, Channel.CONTROL)
+
+    # Плавная остановка: новые подключения отклоняются, очереди подписчиков досылаются
+    # не дольше timeout секунд, затем все сокеты закрываются с кодом 1012
+    async def drain(self, timeout: float):
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline and any(
+            subscriber.queue for room in self.rooms.values() for subscriber in room.subscribers.values()
+        ):
+            await asyncio.sleep(0.05)
+
+        subscribers = [subscriber for room in list(self.rooms.values()) for subscriber in list(room.subscribers.values())]
+        logger.info(f"Закрытие {len(subscribers)} соединений в {len(self.rooms)} комнатах")
+        for subscriber in subscribers:
+            subscriber.close()
+        await asyncio.gather(
+            *[subscriber.websocket.close(code=SERVICE_RESTART_CLOSE_CODE) for subscriber in subscribers],
+            return_exceptions=True
+        )
+
+    # Перенос комнат, которые после изменения состава узлов принадлежат другому узлу.
+    # Клиенты с подпротоколом получают REDIRECT с новым адресом и отключаются через
+    # redirect_grace секунд, остальные отключаются сразу с кодом 1012
+    def rebalance(self):
+        if self.placement is None or not self.enforce_placement:
+            return
+
+        loop = asyncio.get_running_loop()
+        for room in list(self.rooms.values()):
+            if self.placement.is_local(room.room_id):
+                continue
+
+            _, url = self.placement.owner(room.room_id)
+            logger.info(f"Комната {room.room_id} переезжает на {url}")
+            self.moved_rooms += 1
+            redirect = encode_redirect(url)
+            for subscriber in list(room.subscribers.values()):
+                if subscriber.framed:
+                    subscriber.enqueue(redirect, Channel.CONTROL)
+                    loop.call_later(self.redirect_grace, subscriber.close, SERVICE_RESTART_CLOSE_CODE)
+                else:
+                    subscriber.close(SERVICE_RESTART_CLOSE_CODE)
+
+    # Остановка фоновой задачи обслуживания
+    async def stop(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+
+    # Обработка кадра, полученного от клиента: команды сервера применяются к подписчику,
+    # остальные кадры рассылаются участникам комнаты. Формат определяется подпротоколом
+    # клиента, а не содержимым: байты клиента без подпротокола всегда считаются данными
+    async def handle_frame(self, websocket: WebSocket, room_id: str, data: bytes):
+        room = self.rooms.get(room_id)
+        subscriber = room.subscribers.get(websocket) if room is not None else None
+        if subscriber is None:
+            return
+
+        now = time.monotonic()
+        subscriber.last_seen = now
+        room.last_activity = now
+        room.stats.received_frames += 1
+        room.stats.received_bytes += len(data)
+
+        if not self._admit(room, subscriber, len(data), now):
+            return
+
+        if not subscriber.framed:
+            frame = encode_frame(Channel.DATA, subscriber.sender_id, subscriber.sequence, data)
+            subscriber.sequence = (subscriber.sequence + 1) & 0xFFFFFFFF
+            await self.broadcast(room_id, frame, subscriber.sender_id, Channel.DATA)
+            return
+
+        header = parse_header(data)
+        if header is None or header.sender_id != subscriber.sender_id:
+            sampled_logger.warning("invalid_frame_dropped", room_id, room_id=room_id, size=len(data))
+            return
+
+        if header.channel == Channel.CONTROL and self._apply_control(subscriber, data):
+            return
+
+        await self.broadcast(room_id, data, header.sender_id, header.channel)
+
+    # Проверка лимитов входящих кадров. Кадры сверх лимита отбрасываются,
+    # клиент, превысивший лимит max_rejected_frames раз подряд, отключается
+    def _admit(self, room: Room, subscriber: Subscriber, size: int, now: float) -> bool:
+        if subscriber.admit(size, now) and (room.ingress is None or room.ingress.take(self.room_frame_limit, now) == 0):
+            subscriber.rejected_frames = 0
+            return True
+
+        room.stats.rate_limited_frames += 1
+        subscriber.rejected_frames += 1
+        if self.max_rejected_frames and subscriber.rejected_frames >= self.max_rejected_frames:
+            sampled_logger.warning("flooding_client_disconnected", room.room_id, room_id=room.room_id)
+            subscriber.close(RATE_LIMITED_CLOSE_CODE)
+        return False
+
+    def _apply_control(self, subscriber: Subscriber, data: bytes) -> bool:
+        control = parse_control(data)
+        if control is None:
+            return False
+
+        op, value = control
+        if op == ControlOp.SET_CHANNELS:
+            # Управляющие кадры доставляются всегда
+            subscriber.channels = value | (1 << Channel.CONTROL)
+        elif op == ControlOp.MUTE_SENDER:
+            subscriber.muted.add(value)
+        elif op == ControlOp.UNMUTE_SENDER:
+            subscriber.muted.discard(value)
+        return True
+
+    # Раскладывает сообщение по буферам локальных подписчиков и публикует его для других узлов.
+    # Записывается только то, что пришло в этот процесс: кадры из брокера записал их процесс
+    async def broadcast(self, room_id: str, message: bytes, sender_id: int, channel: Channel):
+        if self.recorder is not None:
+            self.recorder.record(room_id, message, sender_id, channel)
+
+        room = self.rooms.get(room_id)
+        if room is not None:
+            self._fan_out(room, message, sender_id, channel)
+
         try:
-            await websocket.send_bytes(message)
-            
+            await self.broker.publish(room_id, message)
         except Exception as e:
-            logger.error(f"Ошибка отправки: {e}")
-            self.disconnect(websocket, room_id)
\ No newline at end of file
+            sampled_logger.error("broker_publish_failed", room_id, room_id=room_id, error=e)
+
+    # Доставка кадра, опубликованного другим узлом, локальным участникам комнаты.
+    # В брокер публикуются только кадры с заголовком, остальное отбрасывается
+    async def _deliver_local(self, room_id: str, message: bytes):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+
+        room.touch()
+        header = parse_header(message)
+        if header is None:
+            sampled_logger.warning("invalid_broker_frame_dropped", room_id, room_id=room_id, size=len(message))
+            return
+        self._fan_out(room, message, header.sender_id, header.channel)
+
+    # Клиенты без подпротокола получают только полезную нагрузку кадров без заголовка,
+    # управляющие кадры им не пересылаются
+    def _fan_out(self, room: Room, message: bytes, sender_id: int, channel: Channel):
+        payload = None
+        for subscriber in list(room.subscribers.values()):
+            if not subscriber.accepts(channel, sender_id):
+                continue
+            if subscriber.framed:
+                subscriber.enqueue(message, channel)
+            elif channel != Channel.CONTROL:
+                if payload is None:
+                    payload = message[HEADER_SIZE:]
+                subscriber.enqueue(payload, channel)
+
+    # Счетчики доставки и глубина очередей подписчиков комнаты
+    def get_room_stats(self, room_id: str) -> Optional[dict]:
+        room = self.rooms.get(room_id)
+        if room is None:
+            return None
+
+        return {
+            **room.stats.as_dict(),
+            "connections": len(room.subscribers),
+            "queued_frames": sum(len(subscriber.queue) for subscriber in room.subscribers.values()),
+        }
+
+    # Метрики комнат для /metrics
+    def collect_metrics(self, writer: PrometheusWriter):
+        writer.gauge("conference_rooms", "Rooms with local connections", len(self.rooms))
+        writer.gauge(
+            "conference_connections",
+            "Local WebSocket connections",
+            sum(len(room.subscribers) for room in self.rooms.values())
+        )
+        writer.counter("conference_reaped_rooms_total", "Rooms closed after being idle", self.reaped_rooms)
+        writer.counter("conference_moved_rooms_total", "Rooms handed over to another node", self.moved_rooms)
+        writer.counter("conference_dead_connections_total", "Connections closed by the heartbeat check", self.dead_connections)
+        for reason, count in self.rejected_connections.items():
+            writer.counter("conference_rejected_connections_total", "Connections refused by admission control", count, {"reason": reason})
+
+        for room_id, room in self.rooms.items():
+            labels = {"room_id": room_id}
+            stats = room.stats
+            connections = room.subscribers.values()
+            writer.gauge("conference_room_connections", "Local connections in room", len(connections), labels)
+            writer.gauge(
+                "conference_room_queue_depth",
+                "Frames waiting in subscriber send queues",
+                sum(len(subscriber.queue) for subscriber in connections),
+                labels
+            )
+            writer.counter("conference_room_received_frames_total", "Frames received from clients", stats.received_frames, labels)
+            writer.counter("conference_room_received_bytes_total", "Bytes received from clients", stats.received_bytes, labels)
+            writer.counter("conference_room_sent_frames_total", "Frames sent to clients", stats.sent_frames, labels)
+            writer.counter("conference_room_sent_bytes_total", "Bytes sent to clients", stats.sent_bytes, labels)
+            writer.counter("conference_room_sent_batches_total", "Batched messages sent to clients", stats.sent_batches, labels)
+            writer.counter("conference_room_dropped_frames_total", "Frames dropped on queue overflow", stats.dropped_oldest, {**labels, "policy": "drop_oldest"})
+            writer.counter("conference_room_dropped_frames_total", "Frames dropped on queue overflow", stats.dropped_newest, {**labels, "policy": "drop_newest"})
+            writer.counter("conference_room_slow_disconnects_total", "Subscribers disconnected as slow consumers", stats.slow_disconnects, labels)
+            writer.counter("conference_room_send_errors_total", "Failed sends", stats.send_errors, labels)
+            writer.counter("conference_room_rate_limited_frames_total", "Incoming frames dropped by rate limits", stats.rate_limited_frames, labels)
+            writer.histogram("conference_room_send_latency_seconds", "Duration of a single WebSocket write", stats.send_latency, labels)
@@ -0,0 +1,303 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field, fields
+from enum import Enum
+import logging
+import math
+import os
+import struct
+import time
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+from fastapi import WebSocket
+from conferences.src.admission.rate_limiter import Limit, TokenBucket
+from conferences.src.monitoring.metrics import Histogram
+from conferences.src.monitoring.sampled_log import RateLimitedLogger
+from conferences.src.monitoring.tracing import tracer
+from conferences.src.streaming.framing import ALL_CHANNELS, Channel
+
+logger = logging.getLogger(__name__)
+sampled_logger = RateLimitedLogger(logger)
+
+# Код закрытия WebSocket для медленного подписчика (policy violation)
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+# Политика обработки переполнения очереди отправки подписчика
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"    # вытеснить самое старое сообщение
+    DROP_NEWEST = "drop_newest"    # отбросить новое сообщение
+    DISCONNECT = "disconnect"      # отбрасывать новые и отключить после N потерь
+
+# Префикс длины кадра внутри пакетного сообщения
+BATCH_LENGTH_PREFIX = struct.Struct("!I")
+
+# Параметры объединения кадров в пакеты: допустимая задержка по каналам (секунды)
+# и максимальный размер пакета. Кадры без канала используют default_budget
+@dataclass
+class BatchConfig:
+    budgets: Dict[Channel, float] = field(default_factory=dict)
+    default_budget: float = 0.0
+    max_bytes: int = 65536
+
+    def budget(self, channel: Optional[Channel]) -> float:
+        if channel is None:
+            return self.default_budget
+        return self.budgets.get(channel, self.default_budget)
+
+# Пакетный режим включается WS_BATCHING=1; задержки задаются в миллисекундах по каналам
+def create_batch_config() -> Optional[BatchConfig]:
+    if os.getenv("WS_BATCHING", "0") != "1":
+        return None
+
+    return BatchConfig(
+        budgets={
+            Channel.AUDIO: float(os.getenv("WS_BATCH_BUDGET_AUDIO_MS", "0")) / 1000,
+            Channel.VIDEO: float(os.getenv("WS_BATCH_BUDGET_VIDEO_MS", "15")) / 1000,
+            Channel.CONTROL: float(os.getenv("WS_BATCH_BUDGET_CONTROL_MS", "5")) / 1000,
+        },
+        max_bytes=int(os.getenv("WS_BATCH_MAX_BYTES", "65536")),
+    )
+
+# Счетчики приема и доставки сообщений в комнате
+@dataclass
+class RoomStats:
+    received_frames: int = 0
+    received_bytes: int = 0
+    sent_frames: int = 0
+    sent_bytes: int = 0
+    sent_batches: int = 0
+    dropped_oldest: int = 0
+    dropped_newest: int = 0
+    slow_disconnects: int = 0
+    send_errors: int = 0
+    rate_limited_frames: int = 0
+    send_latency: Histogram = field(default_factory=Histogram)
+
+    def as_dict(self) -> dict:
+        stats = {item.name: getattr(self, item.name) for item in fields(self)}
+        stats["send_latency"] = self.send_latency.as_dict()
+        return stats
+
+# Подписчик комнаты: собственный ограниченный кольцевой буфер и задача-писатель.
+# Медленный клиент копит отставание только в своем буфере и не задерживает остальных.
+# Подписки на каналы и заглушенные отправители позволяют не пересылать клиенту лишние кадры.
+# В пакетном режиме накопленные кадры уходят одним сообщением [длина uint32][кадр]...,
+# как только истекает допустимая задержка самого срочного из них или набирается max_bytes.
+# При трассировке выбранный кадр отслеживается до отправки: ожидание в очереди и запись в сокет
+class Subscriber:
+    __slots__ = (
+        "websocket", "room_id", "stats", "max_queue_size", "policy", "max_drops",
+        "sender_id", "framed", "channels", "muted", "batching", "sequence",
+        "queue", "dropped", "closed", "last_seen", "_on_close", "_ready", "_task",
+        "_pending_bytes", "_flush_at", "_send_started",
+        "frame_limit", "byte_limit", "_frame_bucket", "_byte_bucket", "rejected_frames",
+        "_traced",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        room_id: str,
+        stats: RoomStats,
+        max_queue_size: int,
+        policy: OverflowPolicy,
+        max_drops: int,
+        on_close: Callable[["Subscriber"], None],
+        sender_id: int = 0,
+        framed: bool = False,
+        batching: Optional[BatchConfig] = None,
+        frame_limit: Optional[Limit] = None,
+        byte_limit: Optional[Limit] = None,
+    ):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.stats = stats
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.max_drops = max_drops
+        self.sender_id = sender_id
+        self.framed = framed
+        self.channels = ALL_CHANNELS
+        self.muted: Set[int] = set()
+        self.batching = batching
+        # Номер следующего кадра, который сервер обернет в заголовок от имени клиента без подпротокола
+        self.sequence = 0
+        self.queue: Deque[bytes] = deque()
+        self._pending_bytes = 0
+        self._flush_at = math.inf
+        self.dropped = 0
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self._send_started = 0.0
+        self.frame_limit = frame_limit
+        self.byte_limit = byte_limit
+        self._frame_bucket = TokenBucket(frame_limit.burst, self.last_seen) if frame_limit is not None else None
+        self._byte_bucket = TokenBucket(byte_limit.burst, self.last_seen) if byte_limit is not None else None
+        self.rejected_frames = 0
+        # Кадр, выбранный для трассировки, и время его постановки в очередь (нс)
+        self._traced: Optional[Tuple[bytes, int]] = None
+        self._on_close = on_close
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    # Нужен ли подписчику кадр канала channel от отправителя sender_id
+    def accepts(self, channel: Optional[Channel], sender_id: int) -> bool:
+        if sender_id == self.sender_id:
+            return False
+        if channel is None:
+            return True
+        return bool(self.channels & (1 << channel)) and sender_id not in self.muted
+
+    # Укладывается ли входящий кадр размером size в лимиты соединения
+    def admit(self, size: int, now: float) -> bool:
+        if self._frame_bucket is not None and self._frame_bucket.take(self.frame_limit, now) > 0:
+            return False
+        return self._byte_bucket is None or self._byte_bucket.take(self.byte_limit, now, size) == 0
+
+    # Сокет считается мертвым, если отправка зависла дольше timeout или клиент
+    # с подпротоколом столько же не присылал кадров (в том числе ответов на PING)
+    def is_dead(self, now: float, timeout: float) -> bool:
+        if self._send_started and now - self._send_started > timeout:
+            return True
+        return self.framed and now - self.last_seen > timeout
+
+    # Неблокирующая постановка сообщения в буфер подписчика
+    def enqueue(self, message: bytes, channel: Optional[Channel] = None) -> bool:
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+
+            if self.policy == OverflowPolicy.DROP_OLDEST:
+                dropped = self.queue.popleft()
+                self._pending_bytes -= len(dropped)
+                self.stats.dropped_oldest += 1
+                if self._traced is not None and dropped is self._traced[0]:
+                    self._traced = None
+            else:
+                self.stats.dropped_newest += 1
+                if self.policy == OverflowPolicy.DISCONNECT and self.dropped >= self.max_drops:
+                    sampled_logger.warning("slow_consumer_disconnected", self.room_id, room_id=self.room_id, dropped=self.dropped)
+                    self.stats.slow_disconnects += 1
+                    self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+
+        self.queue.append(message)
+        self._pending_bytes += len(message)
+        if self._traced is None and tracer.sample(tracer.ws_sample_rate):
+            self._traced = (message, time.time_ns())
+        if self.batching is not None:
+            self._flush_at = min(self._flush_at, asyncio.get_running_loop().time() + self.batching.budget(channel))
+        self._ready.set()
+        return True
+
+    # Остановка писателя и закрытие сокета (без ожидания, безопасно вызывать повторно)
+    def close(self, code: int = 1000):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.queue.clear()
+        self._traced = None
+        self._pending_bytes = 0
+        self._task.cancel()
+        self._on_close(self)
+
+        if code != 1000:
+            asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Не удалось закрыть сокет: {e}")
+
+    # Задача-писатель: последовательно отправляет сообщения из буфера подписчика
+    async def _writer(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+
+                if self.batching is None:
+                    message = self.queue.popleft()
+                    self._pending_bytes -= len(message)
+                    traced = self._take_traced(message)
+                    send_started_ns = time.time_ns() if traced is not None else 0
+                    self._send_started = time.monotonic()
+                    await self.websocket.send_bytes(message)
+                    self.stats.send_latency.observe(time.monotonic() - self._send_started)
+                    if traced is not None:
+                        self._trace_send(traced, send_started_ns, 1, len(message))
+                    self._send_started = 0.0
+                    self.stats.sent_frames += 1
+                    self.stats.sent_bytes += len(message)
+                    continue
+
+                # Ожидание до срока самого срочного кадра; новый кадр может приблизить срок
+                delay = self._flush_at - asyncio.get_running_loop().time()
+                if delay > 0 and self._pending_bytes < self.batching.max_bytes:
+                    self._ready.clear()
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._send_batch()
+
+        except asyncio.CancelledError:
+            pass
+
+        except Exception as e:
+            sampled_logger.error("send_failed", self.room_id, room_id=self.room_id, error=e)
+            self.stats.send_errors += 1
+            self.close()
+
+    # Отправка накопленных кадров одним сообщением размером не больше max_bytes
+    async def _send_batch(self):
+        parts = []
+        size = 0
+        frames = 0
+        traced = None
+        while self.queue:
+            message = self.queue[0]
+            if frames and size + BATCH_LENGTH_PREFIX.size + len(message) > self.batching.max_bytes:
+                break
+            self.queue.popleft()
+            self._pending_bytes -= len(message)
+            traced = self._take_traced(message) or traced
+            parts.append(BATCH_LENGTH_PREFIX.pack(len(message)))
+            parts.append(message)
+            size += BATCH_LENGTH_PREFIX.size + len(message)
+            frames += 1
+
+        # Остаток не уложился в пакет и уже просрочен — отправляется без ожидания
+        self._flush_at = 0.0 if self.queue else math.inf
+
+        send_started_ns = time.time_ns() if traced is not None else 0
+        self._send_started = time.monotonic()
+        await self.websocket.send_bytes(b"".join(parts))
+        self.stats.send_latency.observe(time.monotonic() - self._send_started)
+        self._send_started = 0.0
+        self.stats.sent_frames += frames
+        self.stats.sent_bytes += size
+        self.stats.sent_batches += 1
+        if traced is not None:
+            self._trace_send(traced, send_started_ns, frames, size)
+
+    # Время постановки в очередь, если message — кадр, выбранный для трассировки
+    def _take_traced(self, message: bytes) -> Optional[int]:
+        if self._traced is None or message is not self._traced[0]:
+            return None
+        enqueued_ns = self._traced[1]
+        self._traced = None
+        return enqueued_ns
+
+    # Трасса кадра: ожидание в очереди подписчика и запись в сокет
+    def _trace_send(self, enqueued_ns: int, send_started_ns: int, frames: int, size: int):
+        end_ns = time.time_ns()
+        root = tracer.record("ws frame", enqueued_ns, end_ns, room_id=self.room_id, sender_id=self.sender_id)
+        tracer.record("ws queue_wait", enqueued_ns, send_started_ns, root, queue_depth=len(self.queue))
+        tracer.record("ws send", send_started_ns, end_ns, root, frames=frames, bytes=size)
@@ -0,0 +1,53 @@
+import logging
+import os
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Сервер uvicorn, который перед остановкой досылает очереди signal-сервера
+# и закрывает WebSocket-соединения кодом 1012, чтобы клиенты переподключились
+class DrainingServer(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # Тот же модуль app, который загрузил uvicorn по строке "app:app"
+        from app import manager
+
+        try:
+            await manager.drain(float(os.getenv("WS_DRAIN_TIMEOUT", "5")))
+        except Exception as e:
+            logger.error(f"Ошибка остановки комнат: {e}")
+
+        await super().shutdown(sockets)
+
+# Запуск API в API_WORKERS процессах. Процессы делят комнаты через брокер,
+# поэтому при нескольких воркерах BROKER_URL обязателен. Отложенная запись держит
+# счетчики участников в памяти процесса и с несколькими воркерами не запускается
+def main():
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1 and not os.getenv("BROKER_URL"):
+        raise RuntimeError("Для API_WORKERS > 1 нужен BROKER_URL: без брокера участники комнаты в разных воркерах не видят друг друга")
+    if workers > 1 and os.getenv("WRITE_BEHIND", "0") == "1":
+        raise RuntimeError("WRITE_BEHIND=1 несовместим с API_WORKERS > 1: у каждого воркера своя копия счетчика участников, и их изменения теряются")
+    if workers > 1 and not os.getenv("CACHE_URL"):
+        logger.warning("CACHE_URL не задан: у каждого воркера свой кэш конференций, инвалидация не распространяется между ними")
+    if workers > 1 and os.getenv("RECORDING_DIR") and not os.getenv("RECORDING_STATE_URL"):
+        logger.warning("RECORDING_STATE_URL не задан: запись комнаты включается только в воркере, принявшем запрос")
+
+    config = uvicorn.Config(
+        "app:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=workers,
+        timeout_graceful_shutdown=float(os.getenv("API_GRACEFUL_TIMEOUT", "10")),
+        log_level="info",
+    )
+    server = DrainingServer(config)
+
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    main()
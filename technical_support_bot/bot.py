@@ -1,38 +1,51 @@
 from os import getenv
 from telegram import Update
-from telegram.ext import Updater, CommandHandler, CallbackContext
+from telegram.ext import Application, CommandHandler, ContextTypes
 import logging
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    logger.info("Команда /start получена")
+    await update.message.reply_text('Привет! Я бот-помощник. Что бы вы хотели узнать?')
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    help_text = (
+        "Если в приложении что-то не работает, попробуйте следующие шаги:\n"
+        "1. Убедитесь, что у вас есть подключение к интернету.\n"
+        "2. Перезапустите приложение.\n"
+        "3. Убедитесь, что у вас установлена последняя версия приложения.\n"
+        "4. Проверьте настройки приложения.\n"
+        "5. Если проблема сохраняется, обратитесь в службу поддержки."
+    )
+    await update.message.reply_text(help_text)
+
+def create_application() -> Application:
+    application = Application.builder().token(getenv("API_TOKEN_BOT")).build()
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    return application
+
+# Бот работает отдельным процессом. BOT_MODE=polling (по умолчанию) опрашивает Telegram,
+# BOT_MODE=webhook принимает обновления на BOT_WEBHOOK_URL (нужен python-telegram-bot[webhooks])
 def run_telegram_bot():
-
-    updater = Updater(getenv("API_TOKEN_BOT"))
-    dispatcher = updater.dispatcher
-
-    def start(update: Update, context: CallbackContext) -> None:
-        logger.info("Команда /start получена")
-        update.message.reply_text('Привет! Я бот-помощник. Что бы вы хотели узнать?')
-
-    def help_command(update: Update, context: CallbackContext) -> None:
-        help_text = (
-            "Если в приложении что-то не работает, попробуйте следующие шаги:\n"
-            "1. Убедитесь, что у вас есть подключение к интернету.\n"
-            "2. Перезапустите приложение.\n"
-            "3. Убедитесь, что у вас установлена последняя версия приложения.\n"
-            "4. Проверьте настройки приложения.\n"
-            "5. Если проблема сохраняется, обратитесь в службу поддержки."
+    application = create_application()
+    mode = getenv("BOT_MODE", "polling")
+
+    logger.info(f"Запуск бота в режиме {mode}...")
+    if mode == "webhook":
+        application.run_webhook(
+            listen=getenv("BOT_WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(getenv("BOT_WEBHOOK_PORT", "8443")),
+            url_path=getenv("BOT_WEBHOOK_PATH", "telegram"),
+            webhook_url=getenv("BOT_WEBHOOK_URL"),
+            secret_token=getenv("BOT_WEBHOOK_SECRET") or None,
+            allowed_updates=Update.ALL_TYPES,
         )
-        update.message.reply_text(help_text)
-
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_command))
-
-    logger.info("Запуск бота...")
-    updater.start_polling()
-    updater.idle()
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
-    run_telegram_bot()
\ No newline at end of file
+    run_telegram_bot()
@@ -0,0 +1,41 @@
+from conferences.src.streaming.framing import (
+    FRAME_HEADER, FRAME_VERSION, HEADER_SIZE, SERVER_SENDER_ID, Channel, ControlOp,
+    encode_frame, encode_welcome, parse_control, parse_header,
+)
+
+def test_header_round_trip():
+    frame = encode_frame(Channel.VIDEO, 42, 7, b"payload")
+
+    header = parse_header(frame)
+    assert header.channel == Channel.VIDEO
+    assert header.sender_id == 42
+    assert header.sequence == 7
+    assert frame[HEADER_SIZE:] == b"payload"
+
+def test_data_channel_is_valid():
+    assert parse_header(encode_frame(Channel.DATA, 1, 0, b"")).channel == Channel.DATA
+
+def test_rejects_short_frames_unknown_versions_and_channels():
+    assert parse_header(b"\x01\x00") is None
+    assert parse_header(FRAME_HEADER.pack(FRAME_VERSION + 1, Channel.AUDIO, 1, 0, 0)) is None
+    assert parse_header(FRAME_HEADER.pack(FRAME_VERSION, max(Channel) + 1, 1, 0, 0)) is None
+
+def test_welcome_carries_assigned_sender_id():
+    frame = encode_welcome(9)
+
+    header = parse_header(frame)
+    assert header.channel == Channel.CONTROL
+    assert header.sender_id == SERVER_SENDER_ID
+    assert frame[HEADER_SIZE] == ControlOp.WELCOME
+    assert int.from_bytes(frame[HEADER_SIZE + 1:], "big") == 9
+
+def test_parse_control():
+    def control(payload: bytes):
+        return parse_control(encode_frame(Channel.CONTROL, 1, 0, payload))
+
+    assert control(bytes([ControlOp.SET_CHANNELS, 0b101])) == (ControlOp.SET_CHANNELS, 0b101)
+    assert control(bytes([ControlOp.MUTE_SENDER]) + (300).to_bytes(4, "big")) == (ControlOp.MUTE_SENDER, 300)
+    assert control(bytes([ControlOp.PONG])) == (ControlOp.PONG, 0)
+    # Команда без аргумента и пустой кадр не разбираются
+    assert control(bytes([ControlOp.MUTE_SENDER])) is None
+    assert control(b"") is None
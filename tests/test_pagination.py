@@ -0,0 +1,59 @@
+import asyncio
+import random
+import pytest
+from benchmarks.fake_supabase import FakeSupabase, parse_logic
+from conferences.src.repository.pagination import decode_cursor, encode_cursor, keyset_filter
+
+# Значения с кавычками, обратной косой чертой, запятыми и скобками проверяют экранирование фильтра
+NAMES = ['a"b', "a\\b", "x,y", "и(я)", "plain", "plain", ""]
+
+def conferences(count: int):
+    generator = random.Random(1)
+    return [
+        {"room_id": f"r{index:03d}", "name": generator.choice(NAMES), "users": generator.randint(0, 5), "active": True}
+        for index in range(count)
+    ]
+
+# Обход всех страниц тем же запросом, что и list_conferences
+async def read_pages(client: FakeSupabase, order_by: str, desc: bool, page_size: int):
+    rows, after = [], None
+    while True:
+        query = client.table("conferences").select("*").eq("active", True)
+        if after is not None:
+            value, room_id = decode_cursor(encode_cursor(after, order_by))
+            query = query.or_(keyset_filter(order_by, value, room_id, desc))
+        query = query.order(order_by, desc=desc)
+        if order_by != "room_id":
+            query = query.order("room_id", desc=desc)
+        page = (await query.limit(page_size).execute()).data
+        if not page:
+            return rows
+        rows += page
+        after = page[-1]
+
+@pytest.mark.parametrize("order_by", ["room_id", "name", "users"])
+@pytest.mark.parametrize("desc", [False, True])
+def test_keyset_pages_cover_sorted_rows_once(order_by, desc):
+    rows = conferences(60)
+    client = FakeSupabase()
+    client.tables["conferences"] = [dict(row) for row in rows]
+
+    pages = asyncio.run(read_pages(client, order_by, desc, page_size=7))
+
+    expected = sorted(rows, key=lambda row: (row[order_by], row["room_id"]), reverse=desc)
+    assert [row["room_id"] for row in pages] == [row["room_id"] for row in expected]
+
+def test_cursor_round_trip():
+    row = {"room_id": "r1", "name": 'a"b,c', "users": 3}
+    assert decode_cursor(encode_cursor(row, "name")) == ('a"b,c', "r1")
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+def test_keyset_filter_format():
+    assert keyset_filter("room_id", None, "r1", False) == 'room_id.gt."r1"'
+    assert keyset_filter("users", 3, "r1", True) == 'users.lt.3,and(users.eq.3,room_id.lt."r1")'
+    assert parse_logic("or", keyset_filter("name", 'a"b', "r1", False)) == (
+        "or", [("name", "gt", 'a"b'), ("and", [("name", "eq", 'a"b'), ("room_id", "gt", "r1")])]
+    )
@@ -0,0 +1,48 @@
+from conferences.src.streaming.placement import HashRing, Placement, parse_nodes
+
+ROOMS = [f"room-{index}" for index in range(2000)]
+
+def ring(*node_ids: str) -> HashRing:
+    result = HashRing()
+    result.set_nodes({node_id: f"wss://{node_id}" for node_id in node_ids})
+    return result
+
+def owners(hash_ring: HashRing):
+    return {room_id: hash_ring.node_for(room_id) for room_id in ROOMS}
+
+def test_placement_is_deterministic_and_balanced():
+    placement = owners(ring("a", "b", "c"))
+
+    assert placement == owners(ring("c", "b", "a"))
+    for node_id in "abc":
+        share = sum(owner == node_id for owner in placement.values()) / len(ROOMS)
+        assert 0.2 < share < 0.45
+
+def test_adding_node_moves_only_its_share():
+    before = owners(ring("a", "b", "c"))
+    after = owners(ring("a", "b", "c", "d"))
+
+    moved = [room_id for room_id in ROOMS if before[room_id] != after[room_id]]
+    # Комнаты переезжают только на новый узел, и их около четверти
+    assert all(after[room_id] == "d" for room_id in moved)
+    assert 0.15 < len(moved) / len(ROOMS) < 0.35
+
+def test_removing_node_keeps_other_rooms():
+    before = owners(ring("a", "b", "c"))
+    after = owners(ring("a", "c"))
+
+    assert all(after[room_id] == owner for room_id, owner in before.items() if owner != "b")
+
+def test_empty_ring():
+    assert HashRing().node_for("room") is None
+
+def test_placement_needs_two_nodes():
+    single = Placement("a", node_url="wss://a")
+    assert not single.enabled
+    assert single.is_local("room")
+
+    cluster = Placement("a", static_nodes=parse_nodes("a=wss://a/, b=wss://b"))
+    assert cluster.enabled
+    owner, url = cluster.owner("room")
+    assert url == f"wss://{owner}/ws/room"
+    assert cluster.is_local("room") == (owner == "a")
@@ -0,0 +1,66 @@
+import asyncio
+from typing import List, Tuple
+import fakeredis
+import fakeredis.aioredis
+from conferences.src.streaming.broker import RedisBroker
+
+# RedisBroker поверх общего fakeredis: два узла обмениваются сообщениями комнаты
+
+async def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+def brokers() -> Tuple[RedisBroker, RedisBroker]:
+    server = fakeredis.FakeServer()
+    return (
+        RedisBroker(client=fakeredis.aioredis.FakeRedis(server=server)),
+        RedisBroker(client=fakeredis.aioredis.FakeRedis(server=server)),
+    )
+
+def collector(received: List[Tuple[str, str, bytes]], node: str):
+    async def deliver(room_id: str, message: bytes):
+        received.append((node, room_id, message))
+    return deliver
+
+def test_delivers_to_other_node_without_echo():
+    async def scenario():
+        first, second = brokers()
+        received: List[Tuple[str, str, bytes]] = []
+        try:
+            await first.subscribe("room", collector(received, "a"))
+            await second.subscribe("room", collector(received, "b"))
+
+            await first.publish("room", b"hello")
+            await second.publish("room", b"reply")
+            assert await wait_for(lambda: len(received) >= 2)
+            await asyncio.sleep(0.1)
+        finally:
+            await first.close()
+            await second.close()
+        return received
+
+    assert sorted(asyncio.run(scenario())) == [("a", "room", b"reply"), ("b", "room", b"hello")]
+
+def test_unsubscribed_node_receives_nothing():
+    async def scenario():
+        first, second = brokers()
+        received: List[Tuple[str, str, bytes]] = []
+        try:
+            await second.subscribe("room", collector(received, "b"))
+            await second.subscribe("other", collector(received, "b"))
+            await second.unsubscribe("room")
+
+            await first.publish("room", b"after unsubscribe")
+            await first.publish("other", b"still subscribed")
+            assert await wait_for(lambda: received)
+            await asyncio.sleep(0.1)
+        finally:
+            await first.close()
+            await second.close()
+        return received
+
+    assert asyncio.run(scenario()) == [("b", "other", b"still subscribed")]
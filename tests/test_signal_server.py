@@ -0,0 +1,106 @@
+import asyncio
+from types import SimpleNamespace
+from conferences.src.streaming.broker import InMemoryBroker, InMemoryBus
+from conferences.src.streaming.framing import FRAME_SUBPROTOCOL, HEADER_SIZE, Channel, encode_frame, parse_header
+from conferences.src.streaming.signal_server import ConnectionManager
+
+# WebSocket клиента: старый (без подпротокола, получает только полезную нагрузку) или с заголовками кадров
+class FakeWebSocket:
+    def __init__(self, framed: bool):
+        self.scope = {"subprotocols": [FRAME_SUBPROTOCOL] if framed else [], "headers": []}
+        self.client = SimpleNamespace(host="127.0.0.1", port=1)
+        self.headers = {}
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        pass
+
+async def settle():
+    await asyncio.sleep(0.05)
+
+# Два узла на общей шине, в комнате "room" на каждом по старому и по новому клиенту
+async def cluster():
+    bus = InMemoryBus()
+    first = ConnectionManager(broker=InMemoryBroker(bus))
+    second = ConnectionManager(broker=InMemoryBroker(bus))
+    clients = {name: FakeWebSocket(framed=name.endswith("framed")) for name in
+               ("local legacy", "local framed", "remote legacy", "remote framed")}
+    for name, websocket in clients.items():
+        manager = first if name.startswith("local") else second
+        assert await manager.connect(websocket, "room")
+    await settle()
+    for websocket in clients.values():
+        websocket.sent.clear()
+    return first, second, clients
+
+def sender_id(manager: ConnectionManager, websocket: FakeWebSocket) -> int:
+    return manager.rooms["room"].subscribers[websocket].sender_id
+
+def test_legacy_sender_reaches_everyone():
+    async def scenario():
+        first, second, clients = await cluster()
+        sender = clients["local legacy"]
+        # Полезная нагрузка, похожая на управляющий кадр, пересылается как данные
+        tricky = encode_frame(Channel.CONTROL, 0, 0, b"\x07payload")
+        await first.handle_frame(sender, "room", tricky)
+        await first.handle_frame(sender, "room", b"hello")
+        await settle()
+        result = {name: list(websocket.sent) for name, websocket in clients.items()}, sender_id(first, sender)
+        await first.stop()
+        await second.stop()
+        return tricky, result
+
+    tricky, (sent, legacy_id) = asyncio.run(scenario())
+
+    assert sent["local legacy"] == []
+    assert sent["remote legacy"] == [tricky, b"hello"]
+    for name in ("local framed", "remote framed"):
+        headers = [parse_header(message) for message in sent[name]]
+        assert [(header.channel, header.sender_id, header.sequence) for header in headers] == [
+            (Channel.DATA, legacy_id, 0), (Channel.DATA, legacy_id, 1),
+        ]
+        assert [message[HEADER_SIZE:] for message in sent[name]] == [tricky, b"hello"]
+
+def test_framed_sender_strips_headers_for_legacy_and_keeps_control_framed():
+    async def scenario():
+        first, second, clients = await cluster()
+        sender = clients["local framed"]
+        framed_id = sender_id(first, sender)
+        frames = [
+            encode_frame(Channel.AUDIO, framed_id, 1, b"audio"),
+            encode_frame(Channel.VIDEO, framed_id, 2, b"video"),
+            encode_frame(Channel.DATA, framed_id, 3, b"data"),
+            encode_frame(Channel.CONTROL, framed_id, 4, b"\x09control"),
+        ]
+        for frame in frames:
+            await first.handle_frame(sender, "room", frame)
+        await settle()
+        sent = {name: list(websocket.sent) for name, websocket in clients.items()}
+        await first.stop()
+        await second.stop()
+        return frames, sent
+
+    frames, sent = asyncio.run(scenario())
+
+    assert sent["local framed"] == []
+    for name in ("local legacy", "remote legacy"):
+        assert sent[name] == [b"audio", b"video", b"data"]
+    assert sent["remote framed"] == frames
+
+def test_frames_without_header_from_broker_are_dropped():
+    async def scenario():
+        first, second, clients = await cluster()
+        await second._deliver_local("room", b"raw")
+        await settle()
+        sent = [message for websocket in clients.values() for message in websocket.sent]
+        await first.stop()
+        await second.stop()
+        return sent
+
+    assert asyncio.run(scenario()) == []
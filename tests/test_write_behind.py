@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import pytest
+from benchmarks.fake_supabase import FakeQuery, FakeSupabase
+from conferences.database.cache import InMemoryConferenceCache
+from conferences.database.write_behind import WriteBehind
+
+def conference(room_id: str, users: int = 1) -> dict:
+    return {"room_id": room_id, "name": room_id, "users": users, "active": True, "created_by": "user"}
+
+def rows(client: FakeSupabase) -> dict:
+    return {row["room_id"]: row for row in client.tables["conferences"]}
+
+# Падение процесса: фоновая задача остановлена, журналы закрыты без удаления
+def crash(write_behind: WriteBehind):
+    if write_behind._task:
+        write_behind._task.cancel()
+    segments = write_behind._segments + [segment for batch in write_behind._inflight for segment in batch.segments]
+    for _, journal in segments:
+        journal.close()
+
+# Запросы указанной операции (и, если задано, конференции) завершаются ошибкой сети
+def fail_on(monkeypatch, operation: str, room_id=None):
+    execute = FakeQuery.execute
+
+    async def failing(self):
+        if self.operation == operation and (room_id is None or ("room_id", room_id) in self.filters):
+            raise RuntimeError("network")
+        return await execute(self)
+    monkeypatch.setattr(FakeQuery, "execute", failing)
+
+@pytest.fixture
+def client() -> FakeSupabase:
+    result = FakeSupabase()
+    result.tables["conferences"] = [conference("b"), conference("c", users=5)]
+    return result
+
+def start(journal_dir, client: FakeSupabase) -> WriteBehind:
+    async def get_client():
+        return client
+    return WriteBehind(str(journal_dir), flush_interval=100, get_client=get_client)
+
+def test_recovers_batch_after_crash_without_duplicates(tmp_path, client, monkeypatch):
+    async def scenario():
+        first = start(tmp_path, client)
+        await first.start()
+        await first.insert(conference("a"))
+        await first.update("b", {"name": "B"})
+        await first.adjust_users(InMemoryConferenceCache(10, 100), "c", +1)
+
+        # Вставка проходит, обновление падает: пакет частично применен
+        fail_on(monkeypatch, "update")
+        with pytest.raises(RuntimeError):
+            await first.flush()
+        crash(first)
+        monkeypatch.undo()
+
+        second = start(tmp_path, client)
+        await second.start()
+        assert [sorted(batch.changes) for batch in second._inflight] == [["a", "b", "c"]]
+        await second.flush()
+        await second.close()
+        return second
+
+    second = asyncio.run(scenario())
+
+    assert [row["room_id"] for row in client.tables["conferences"]].count("a") == 1
+    assert rows(client)["b"]["name"] == "B"
+    assert rows(client)["c"]["users"] == 6
+    assert second.stats.flush_errors == 0
+    assert not list(tmp_path.glob("*.journal"))
+
+def test_replay_does_not_apply_users_delta_twice(tmp_path, client, monkeypatch):
+    async def scenario():
+        first = start(tmp_path, client)
+        await first.start()
+        await first.adjust_users(InMemoryConferenceCache(10, 100), "c", +2)
+        await first.delete("b")
+
+        # Изменение users записано, удаление падает, после перезапуска пакет повторяется
+        fail_on(monkeypatch, "delete")
+        with pytest.raises(RuntimeError):
+            await first.flush()
+        crash(first)
+        monkeypatch.undo()
+
+        second = start(tmp_path, client)
+        await second.start()
+        await second.flush()
+        await second.close()
+
+    asyncio.run(scenario())
+
+    assert rows(client)["c"]["users"] == 7
+    assert "b" not in rows(client)
+
+def test_unwritable_change_goes_to_dead_letter(tmp_path, client, monkeypatch):
+    async def scenario():
+        write_behind = start(tmp_path, client)
+        await write_behind.start()
+        fail_on(monkeypatch, "update", room_id="x")
+        await write_behind.update("x", {"name": "X"})
+        await write_behind.update("b", {"name": "B"})
+        for _ in range(write_behind.max_retries):
+            try:
+                await write_behind.flush()
+            except RuntimeError:
+                pass
+        monkeypatch.undo()
+        await write_behind.close()
+        return write_behind
+
+    write_behind = asyncio.run(scenario())
+
+    assert rows(client)["b"]["name"] == "B"
+    assert write_behind.stats.dead_lettered == 1
+    assert not write_behind._inflight
+    [dead_letter] = (tmp_path / "dead_letter").iterdir()
+    [record] = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert (record["op"], record["room_id"], record["fields"]) == ("update", "x", {"name": "X"})
+
+def test_same_room_changes_are_serialized(tmp_path, client):
+    async def scenario():
+        write_behind = start(tmp_path, client)
+        await write_behind.start()
+        results = await asyncio.gather(
+            *[write_behind.adjust_users(InMemoryConferenceCache(10, 100), "c", 1) for _ in range(5)]
+        )
+        locks = dict(write_behind._room_locks)
+        await write_behind.close()
+        return results, locks
+
+    results, locks = asyncio.run(scenario())
+
+    assert [result["users"] for result in results] == [6, 7, 8, 9, 10]
+    assert locks == {}
+    assert rows(client)["c"]["users"] == 10